@@ -2,6 +2,7 @@
 Configuration management for the API service.
 Supports both local development and cloud deployment.
 """
+from functools import lru_cache
 from pydantic_settings import BaseSettings
 from typing import Literal
 
@@ -19,6 +20,7 @@ class Settings(BaseSettings):
     api_port: int = 8000
     api_workers: int = 4
     max_request_size: int = 10 * 1024 * 1024  # 10MB
+    offload_threshold_bytes: int = 64 * 1024  # Decode larger bodies in a thread
     
     # Message Queue (Local: Redis, Cloud: Pub/Sub)
     queue_type: Literal["redis", "pubsub"] = "redis"
@@ -26,6 +28,9 @@ class Settings(BaseSettings):
     redis_port: int = 6379
     redis_db: int = 0
     redis_queue_name: str = "log-ingestion"
+    redis_shard_count: int = 16  # Must match between API and worker
+    publish_batch_size: int = 256
+    publish_max_pending: int = 10_000
     
     # GCP Pub/Sub (for cloud deployment)
     gcp_project_id: str = ""
@@ -49,5 +54,16 @@ class Settings(BaseSettings):
         case_sensitive = False
 
 
-# Global settings instance
-settings = Settings()
\ No newline at end of file
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """
+    Get the settings, parsed from the environment once per process.
+    
+    Request handlers take it as a dependency, so tests can swap it
+    through app.dependency_overrides.
+    """
+    return Settings()
+
+
+# Startup-time configuration (logging, queue, app metadata)
+settings = get_settings()
@@ -2,24 +2,33 @@
 FastAPI application for log ingestion.
 Handles both JSON and plain text formats with async processing.
 """
+import codecs
 import logging
-import uuid
-from datetime import datetime
-from typing import Optional
+from contextlib import asynccontextmanager
+from typing import Annotated, Optional
+from uuid import uuid4
 
-from fastapi import FastAPI, Request, Header, HTTPException, status
-from fastapi.responses import JSONResponse
-from fastapi.middleware.cors import CORSMiddleware
+import orjson
+from fastapi import Depends, FastAPI, Request, Header, HTTPException, status
+from fastapi.responses import ORJSONResponse
 
-from api.config import settings
+from api.config import Settings, get_settings, settings
+from api.middleware import StaticCORSMiddleware
 from api.models import (
     JSONLogPayload, 
     IngestResponse, 
-    ErrorResponse, 
-    NormalizedMessage
+    ErrorResponse
+)
+from api.utils import (
+    PIIRedactor,
+    normalize_tenant_id,
+    generate_log_id,
+    run_off_loop_if_large,
+    utc_now_iso,
+    CachedTimestamp
 )
-from api.utils import PIIRedactor, normalize_tenant_id, validate_text_size, generate_log_id
 from shared.message_queue import get_message_queue
+from shared.publish_batcher import PublishBatcher
 
 # Configure logging
 logging.basicConfig(
@@ -28,22 +37,8 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Initialize FastAPI app
-app = FastAPI(
-    title=settings.app_name,
-    version=settings.app_version,
-    docs_url="/docs" if settings.environment != "production" else None,
-    redoc_url="/redoc" if settings.environment != "production" else None
-)
-
-# Add CORS middleware
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+# Timestamp returned by the health endpoints, refreshed once per second
+probe_timestamp = CachedTimestamp(interval_seconds=1.0)
 
 # Initialize message queue
 message_queue = get_message_queue(
@@ -52,28 +47,59 @@ message_queue = get_message_queue(
     port=settings.redis_port,
     db=settings.redis_db,
     queue_name=settings.redis_queue_name,
+    shard_count=settings.redis_shard_count,
     project_id=settings.gcp_project_id,
     topic_name=settings.pubsub_topic
 )
 
+# Coalesce publishes from concurrent requests into batches
+publisher = PublishBatcher(
+    message_queue,
+    batch_size=settings.publish_batch_size,
+    max_pending=settings.publish_max_pending
+)
 
-@app.on_event("startup")
-async def startup_event():
-    """Initialize services on startup."""
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Initialize services on startup and clean up on shutdown."""
     logger.info(f"Starting {settings.app_name} v{settings.app_version}")
     logger.info(f"Environment: {settings.environment}")
     logger.info(f"Queue type: {settings.queue_type}")
-
-
-@app.on_event("shutdown")
-async def shutdown_event():
-    """Cleanup on shutdown."""
+    
+    # Pre-open the queue connection so the first request doesn't pay for it
+    try:
+        await message_queue.connect()
+    except Exception as e:
+        logger.warning(f"Message queue warmup failed, will retry on first publish: {e}")
+    
+    publisher.start()
+    probe_timestamp.start()
+    
+    yield
+    
     logger.info("Shutting down gracefully...")
+    await probe_timestamp.close()
+    await publisher.close()
     await message_queue.close()
 
 
+# Initialize FastAPI app
+app = FastAPI(
+    title=settings.app_name,
+    version=settings.app_version,
+    docs_url="/docs" if settings.environment != "production" else None,
+    redoc_url="/redoc" if settings.environment != "production" else None,
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
+)
+
+# Add CORS headers (static, no per-request matching)
+app.add_middleware(StaticCORSMiddleware)
+
+
 @app.get("/")
-async def root():
+async def root(settings: Annotated[Settings, Depends(get_settings)]):
     """Root endpoint."""
     return {
         "service": settings.app_name,
@@ -85,14 +111,14 @@ async def root():
 @app.get("/health")
 async def health_check():
     """Health check endpoint for load balancers."""
-    return {"status": "healthy", "timestamp": datetime.utcnow().isoformat()}
+    return {"status": "healthy", "timestamp": probe_timestamp.value}
 
 
 @app.get("/readiness")
 async def readiness_check():
     """Readiness check endpoint."""
     # In production, check if message queue is accessible
-    return {"status": "ready", "timestamp": datetime.utcnow().isoformat()}
+    return {"status": "ready", "timestamp": probe_timestamp.value}
 
 
 @app.post("/ingest", 
@@ -106,8 +132,9 @@ async def readiness_check():
           })
 async def ingest_log(
     request: Request,
-    content_type: Optional[str] = Header(None),
-    x_tenant_id: Optional[str] = Header(None, alias="X-Tenant-ID")
+    settings: Annotated[Settings, Depends(get_settings)],
+    content_type: Annotated[Optional[str], Header()] = None,
+    x_tenant_id: Annotated[Optional[str], Header(alias="X-Tenant-ID")] = None
 ):
     """
     Unified ingestion endpoint for logs.
@@ -123,26 +150,30 @@ async def ingest_log(
     Returns:
         202 Accepted with tracking information
     """
-    request_id = str(uuid.uuid4())
+    request_id = uuid4().hex
+    request.state.request_id = request_id
     
     try:
-        # Determine content type
-        content_type_lower = (content_type or "").lower()
-        
-        # Handle JSON payload
-        if "application/json" in content_type_lower:
-            return await handle_json_ingestion(request, request_id)
+        # Reject oversized bodies up front when the client declares the size
+        content_length = request.headers.get("content-length", "")
+        if content_length.isdigit() and int(content_length) > settings.max_request_size:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail="Text payload exceeds maximum size"
+            )
         
-        # Handle plain text payload
-        elif "text/plain" in content_type_lower:
-            return await handle_text_ingestion(request, x_tenant_id, request_id)
+        # Dispatch on the media type, ignoring parameters such as charset
+        media_type = (content_type or "").partition(';')[0].strip().lower()
+        handler = INGEST_HANDLERS.get(media_type)
         
-        else:
+        if handler is None:
             logger.warning(f"Unsupported content type: {content_type}")
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"Unsupported Content-Type: {content_type}. Use application/json or text/plain"
             )
+        
+        return await handler(request, x_tenant_id, request_id, settings)
     
     except HTTPException:
         raise
@@ -154,43 +185,66 @@ async def ingest_log(
         )
 
 
-async def handle_json_ingestion(request: Request, request_id: str) -> IngestResponse:
+async def read_body_limited(request: Request, max_bytes: int) -> bytearray:
+    """
+    Read the request body, stopping as soon as it exceeds max_bytes.
+    
+    Caps memory per request at max_bytes even when the client sends no
+    (or a false) Content-Length.
+    
+    Args:
+        request: FastAPI request object
+        max_bytes: Maximum allowed body size
+        
+    Returns:
+        Body bytes
+    """
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > max_bytes:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail="Text payload exceeds maximum size"
+            )
+    return body
+
+
+async def handle_json_ingestion(request: Request, request_id: str, settings: Settings) -> IngestResponse:
     """
     Handle JSON format ingestion.
     
     Args:
         request: FastAPI request object
         request_id: Unique request identifier
+        settings: Settings for this request
         
     Returns:
         IngestResponse
     """
     try:
-        # Parse JSON body
-        body = await request.json()
-        payload = JSONLogPayload(**body)
+        raw = await read_body_limited(request, settings.max_request_size)
         
-        # Validate text size
-        if not validate_text_size(payload.text, settings.max_request_size // (1024 * 1024)):
-            raise HTTPException(
-                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-                detail="Text payload exceeds maximum size"
-            )
+        # Parse JSON body (off the event loop for large payloads)
+        body = await run_off_loop_if_large(orjson.loads, raw, settings.offload_threshold_bytes)
+        payload = JSONLogPayload(**body)
         
         # Normalize tenant ID
         tenant_id = normalize_tenant_id(payload.tenant_id)
         
-        # Create normalized message
-        normalized_msg = NormalizedMessage(
-            tenant_id=tenant_id,
-            log_id=payload.log_id,
-            text=payload.text,
-            source="json",
-            request_id=request_id
-        )
+        # Build the queue message directly; fields are already validated by
+        # JSONLogPayload or generated server-side (NormalizedMessage shape)
+        normalized_msg = {
+            "tenant_id": tenant_id,
+            "log_id": payload.log_id,
+            "text": payload.text,
+            "source": "json",
+            "ingested_at": utc_now_iso(),
+            "request_id": request_id
+        }
         
-        # Publish to message queue (non-blocking)
-        success = await message_queue.publish(normalized_msg.to_dict())
+        # Hand off to the publish batcher (non-blocking)
+        success = await publisher.publish(normalized_msg)
         
         if not success:
             raise HTTPException(
@@ -219,7 +273,8 @@ async def handle_json_ingestion(request: Request, request_id: str) -> IngestResp
 async def handle_text_ingestion(
     request: Request, 
     tenant_id: Optional[str], 
-    request_id: str
+    request_id: str,
+    settings: Settings
 ) -> IngestResponse:
     """
     Handle plain text format ingestion.
@@ -228,6 +283,7 @@ async def handle_text_ingestion(
         request: FastAPI request object
         tenant_id: Tenant ID from X-Tenant-ID header
         request_id: Unique request identifier
+        settings: Settings for this request
         
     Returns:
         IngestResponse
@@ -241,8 +297,11 @@ async def handle_text_ingestion(
             )
         
         # Read text body
-        text = await request.body()
-        text_str = text.decode('utf-8')
+        raw = await read_body_limited(request, settings.max_request_size)
+        
+        text_str = await run_off_loop_if_large(
+            codecs.decode, raw, settings.offload_threshold_bytes, 'utf-8'
+        )
         
         if not text_str.strip():
             raise HTTPException(
@@ -250,30 +309,24 @@ async def handle_text_ingestion(
                 detail="Text payload cannot be empty"
             )
         
-        # Validate text size
-        if not validate_text_size(text_str, settings.max_request_size // (1024 * 1024)):
-            raise HTTPException(
-                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-                detail="Text payload exceeds maximum size"
-            )
-        
         # Normalize tenant ID
         normalized_tenant = normalize_tenant_id(tenant_id)
         
         # Generate log ID
         log_id = generate_log_id(normalized_tenant)
         
-        # Create normalized message
-        normalized_msg = NormalizedMessage(
-            tenant_id=normalized_tenant,
-            log_id=log_id,
-            text=text_str,
-            source="text",
-            request_id=request_id
-        )
+        # Build the queue message directly (NormalizedMessage shape)
+        normalized_msg = {
+            "tenant_id": normalized_tenant,
+            "log_id": log_id,
+            "text": text_str,
+            "source": "text",
+            "ingested_at": utc_now_iso(),
+            "request_id": request_id
+        }
         
-        # Publish to message queue (non-blocking)
-        success = await message_queue.publish(normalized_msg.to_dict())
+        # Hand off to the publish batcher (non-blocking)
+        success = await publisher.publish(normalized_msg)
         
         if not success:
             raise HTTPException(
@@ -299,16 +352,25 @@ async def handle_text_ingestion(
         )
 
 
+# Ingestion handlers keyed by media type, called as handler(request, tenant_id, request_id, settings)
+INGEST_HANDLERS = {
+    "application/json": lambda request, tenant_id, request_id, settings: handle_json_ingestion(
+        request, request_id, settings
+    ),
+    "text/plain": handle_text_ingestion,
+}
+
+
 # Error handlers
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request: Request, exc: HTTPException):
     """Handle HTTP exceptions."""
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=exc.status_code,
         content={
             "status": "error",
             "message": exc.detail,
-            "request_id": str(uuid.uuid4())
+            "request_id": getattr(request.state, "request_id", None) or uuid4().hex
         }
     )
 
@@ -317,11 +379,11 @@ async def http_exception_handler(request: Request, exc: HTTPException):
 async def general_exception_handler(request: Request, exc: Exception):
     """Handle general exceptions."""
     logger.error(f"Unhandled exception: {exc}", exc_info=True)
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
         content={
             "status": "error",
             "message": "Internal server error",
-            "request_id": str(uuid.uuid4())
+            "request_id": getattr(request.state, "request_id", None) or uuid4().hex
         }
     )
\ No newline at end of file
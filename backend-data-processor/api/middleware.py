@@ -0,0 +1,94 @@
+"""
+Lightweight ASGI middleware for the API service.
+"""
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Same policy as CORSMiddleware(allow_origins=["*"], allow_methods=["*"],
+# allow_headers=["*"], allow_credentials=True)
+CORS_HEADERS = [
+    (b"access-control-allow-origin", b"*"),
+    (b"access-control-allow-credentials", b"true"),
+]
+
+# Credentialed responses must name the origin rather than "*"
+CREDENTIALED_CORS_HEADERS = [
+    (b"access-control-allow-credentials", b"true"),
+    (b"vary", b"Origin"),
+]
+
+PREFLIGHT_HEADERS = CREDENTIALED_CORS_HEADERS + [
+    (b"access-control-allow-methods", b"DELETE, GET, HEAD, OPTIONS, PATCH, POST, PUT"),
+    (b"access-control-max-age", b"600"),
+    (b"content-length", b"0"),
+]
+
+
+class StaticCORSMiddleware:
+    """
+    Permissive, credential-allowing CORS with minimal per-request work.
+    
+    Responses get fixed headers appended at response start. Requests that
+    carry cookies, and preflights, get their Origin echoed back (and
+    preflights their requested headers), since browsers reject "*" on
+    credentialed requests. That mirrors Starlette's CORSMiddleware with
+    allow_credentials=True, without its per-request origin/method/header
+    matching.
+    """
+    
+    def __init__(self, app: ASGIApp):
+        """
+        Initialize the middleware.
+        
+        Args:
+            app: Downstream ASGI application
+        """
+        self.app = app
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        origin, has_cookie, request_method, request_headers = _cors_request_headers(scope)
+        
+        if scope["method"] == "OPTIONS" and request_method is not None:
+            headers = PREFLIGHT_HEADERS + [(b"access-control-allow-origin", origin or b"*")]
+            if request_headers is not None:
+                headers.append((b"access-control-allow-headers", request_headers))
+            await send({"type": "http.response.start", "status": 200, "headers": headers})
+            await send({"type": "http.response.body", "body": b""})
+            return
+        
+        if origin is not None and has_cookie:
+            cors_headers = CREDENTIALED_CORS_HEADERS + [(b"access-control-allow-origin", origin)]
+        else:
+            cors_headers = CORS_HEADERS
+        
+        async def send_with_cors(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + cors_headers
+            await send(message)
+        
+        await self.app(scope, receive, send_with_cors)
+
+
+def _cors_request_headers(scope: Scope) -> tuple:
+    """
+    Pick the CORS-relevant request headers in one pass.
+    
+    Returns:
+        Tuple of (origin, has_cookie, access-control-request-method,
+        access-control-request-headers); absent headers are None
+    """
+    origin = request_method = request_headers = None
+    has_cookie = False
+    for name, value in scope["headers"]:
+        if name == b"origin":
+            origin = value
+        elif name == b"cookie":
+            has_cookie = True
+        elif name == b"access-control-request-method":
+            request_method = value
+        elif name == b"access-control-request-headers":
+            request_headers = value
+    return origin, has_cookie, request_method, request_headers
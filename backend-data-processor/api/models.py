@@ -1,24 +1,27 @@
 """
 Data models and schemas for API requests and internal processing.
 """
-from pydantic import BaseModel, Field, validator
-from typing import Optional, Literal
-from datetime import datetime
-import uuid
+from pydantic import BaseModel, Field, StringConstraints
+from typing import Annotated, Optional, Literal
+from datetime import datetime, timezone
+
+import msgspec
+
+_UTC = timezone.utc
+
+# ID safe for use in paths: alphanumerics, hyphens and underscores only.
+# Checked by pydantic-core's compiled regex, without a Python validator.
+SafeId = Annotated[
+    str,
+    StringConstraints(min_length=1, max_length=100, pattern=r'^[A-Za-z0-9_-]+$')
+]
 
 
 class JSONLogPayload(BaseModel):
     """Schema for JSON log ingestion."""
-    tenant_id: str = Field(..., min_length=1, max_length=100)
-    log_id: str = Field(..., min_length=1, max_length=100)
+    tenant_id: SafeId
+    log_id: SafeId
     text: str = Field(..., min_length=1)
-    
-    @validator('tenant_id', 'log_id')
-    def validate_alphanumeric(cls, v):
-        """Ensure tenant_id and log_id are safe for use in paths."""
-        if not v.replace('_', '').replace('-', '').isalnum():
-            raise ValueError('Must contain only alphanumeric characters, hyphens, and underscores')
-        return v
 
 
 class IngestResponse(BaseModel):
@@ -27,49 +30,50 @@ class IngestResponse(BaseModel):
     message: str = "Log queued for processing"
     log_id: str
     tenant_id: str
-    request_id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    request_id: str
 
 
 class ErrorResponse(BaseModel):
     """Error response model."""
     status: str = "error"
     message: str
-    request_id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    request_id: str
 
 
-class NormalizedMessage(BaseModel):
+class NormalizedMessage(msgspec.Struct, frozen=True, gc=False):
     """Internal normalized message format for queue."""
     tenant_id: str
     log_id: str
     text: str
     source: Literal["json", "text"]
-    ingested_at: datetime = Field(default_factory=datetime.utcnow)
     request_id: str
-    
-    def to_dict(self) -> dict:
-        """Convert to dictionary for serialization."""
-        return {
-            "tenant_id": self.tenant_id,
-            "log_id": self.log_id,
-            "text": self.text,
-            "source": self.source,
-            "ingested_at": self.ingested_at.isoformat(),
-            "request_id": self.request_id
-        }
+    ingested_at: datetime = msgspec.field(default_factory=lambda: datetime.now(_UTC))
     
     @classmethod
     def from_dict(cls, data: dict) -> "NormalizedMessage":
         """Create from dictionary (deserialization)."""
-        data["ingested_at"] = datetime.fromisoformat(data["ingested_at"])
-        return cls(**data)
+        return msgspec.convert(data, cls)
+    
+    @classmethod
+    def from_json(cls, data: bytes) -> "NormalizedMessage":
+        """Decode and validate queue JSON bytes in a single pass."""
+        return _MESSAGE_DECODER.decode(data)
 
 
-class ProcessedLog(BaseModel):
-    """Schema for processed log stored in database."""
+_MESSAGE_DECODER = msgspec.json.Decoder(NormalizedMessage)
+
+
+class ProcessedLog(msgspec.Struct, gc=False):
+    """
+    Schema for processed log stored in database.
+    
+    Built by the worker from already-validated fields, so it is a plain
+    C-level struct with no per-instance validation or __dict__.
+    """
     log_id: str
     tenant_id: str
     source: Literal["json_upload", "text_upload"]
-    original_text: str
+    original_text: Optional[str]  # None when the worker doesn't keep the unredacted text
     modified_data: str
     ingested_at: datetime
     processed_at: datetime
@@ -78,9 +82,16 @@ class ProcessedLog(BaseModel):
     request_id: str
     
     def to_firestore_dict(self) -> dict:
-        """Convert to Firestore-compatible dictionary."""
+        """
+        Convert to Firestore-compatible dictionary.
+        
+        Kept as a single dict literal: CPython builds it with one
+        BUILD_CONST_KEY_MAP over interned constant keys, which is what a
+        generated serializer would compile to as well.
+        """
         return {
             "log_id": self.log_id,
+            "tenant_id": self.tenant_id,
             "source": self.source,
             "original_text": self.original_text,
             "modified_data": self.modified_data,
@@ -2,11 +2,59 @@
 Utility functions for data processing and PII redaction.
 """
 import re
+import time
+import asyncio
+import itertools
 import logging
-from typing import Tuple
+from bisect import bisect_right
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Any, Callable, List, Optional, Tuple
+from uuid import uuid4
+
+try:
+    from pii_redactor import Redactor as NativeRedactor
+except ImportError:  # Optional native extension, see native/pii_redactor
+    NativeRedactor = None
+
+try:
+    import hyperscan
+except ImportError:  # Optional accelerator, falls back to the re engine
+    hyperscan = None
 
 logger = logging.getLogger(__name__)
 
+_UTC = timezone.utc
+
+# Characters not allowed in tenant IDs
+_TENANT_UNSAFE_RE = re.compile(r'[^a-zA-Z0-9_-]')
+
+
+def _build_hyperscan_db(patterns: dict) -> Optional["hyperscan.Database"]:
+    """
+    Compile PII patterns into a Hyperscan block-mode database.
+    
+    Args:
+        patterns: Mapping of PII type to regex pattern
+        
+    Returns:
+        Compiled database, or None if Hyperscan is unavailable
+    """
+    if hyperscan is None:
+        return None
+    
+    try:
+        db = hyperscan.Database()
+        db.compile(
+            expressions=[pattern.encode('utf-8') for pattern in patterns.values()],
+            ids=list(range(len(patterns))),
+            elements=len(patterns)
+        )
+        return db
+    except Exception as e:
+        logger.warning(f"Failed to compile Hyperscan database, using re: {e}")
+        return None
+
 
 class PIIRedactor:
     """Handles PII (Personally Identifiable Information) redaction."""
@@ -20,6 +68,24 @@ class PIIRedactor:
         'ip_address': r'\b(?:\d{1,3}\.){3}\d{1,3}\b',
     }
     
+    # Single alternation of all patterns so the text is scanned only once
+    _COMBINED = re.compile(
+        "|".join(f"(?P<{pii_type}>{pattern})" for pii_type, pattern in PATTERNS.items())
+    )
+    
+    # Replacement token per named group, built once instead of per match
+    _TOKENS = {pii_type: f'[{pii_type.upper()}_REDACTED]' for pii_type in PATTERNS}
+    
+    # Joins texts for a batch scan. No pattern can match it, and it is not
+    # whitespace to \s (unlike \x1f), so no match can span two texts
+    _BATCH_SEPARATOR = '\x00'
+    
+    # Native (Rust) redactor, releases the GIL while scanning
+    _NATIVE = NativeRedactor(list(PATTERNS.items())) if NativeRedactor else None
+    
+    # Hyperscan database, used to find the texts that contain PII
+    _HS_DB = _build_hyperscan_db(PATTERNS)
+    
     @classmethod
     def redact(cls, text: str, enable: bool = True) -> Tuple[str, int]:
         """
@@ -35,18 +101,180 @@ class PIIRedactor:
         if not enable:
             return text, 0
         
-        redacted_text = text
-        total_redactions = 0
+        if cls._NATIVE is not None:
+            return cls._NATIVE.redact(text)
         
-        for pii_type, pattern in cls.PATTERNS.items():
-            matches = re.findall(pattern, redacted_text)
-            if matches:
-                count = len(matches)
-                total_redactions += count
-                redacted_text = re.sub(pattern, f'[{pii_type.upper()}_REDACTED]', redacted_text)
-                logger.debug(f"Redacted {count} {pii_type} instances")
+        if cls._HS_DB is not None:
+            return cls._redact_hyperscan(text)
+        
+        # subn counts the replacements itself, so the callback is a plain lookup
+        tokens = cls._TOKENS
+        redacted_text, total_redactions = cls._COMBINED.subn(
+            lambda match: tokens[match.lastgroup], text
+        )
+        
+        if total_redactions:
+            logger.debug(f"Redacted {total_redactions} PII instances")
         
         return redacted_text, total_redactions
+    
+    @classmethod
+    def redact_many(cls, texts: List[str], enable: bool = True) -> List[Tuple[str, int]]:
+        """
+        Redact PII from several texts with a single scan.
+        
+        The texts are joined with a separator, scanned once with the
+        combined regex and split back apart; each match is credited to its
+        text by offset. With Hyperscan the single scan only picks out the
+        texts that contain PII, and just those are redacted. The native engine
+        already scans outside the interpreter, so with it each text is
+        redacted on its own.
+        
+        Args:
+            texts: Input texts to redact
+            enable: Whether to enable redaction (can be disabled for testing)
+            
+        Returns:
+            List of (redacted_text, redaction_count), in input order
+        """
+        if not enable:
+            return [(text, 0) for text in texts]
+        
+        separator = cls._BATCH_SEPARATOR
+        if len(texts) < 2 or cls._NATIVE is not None or any(separator in text for text in texts):
+            return [cls.redact(text) for text in texts]
+        
+        if cls._HS_DB is not None:
+            return cls._redact_hyperscan_many(texts)
+        
+        # Offset at which each text starts within the joined string
+        starts = list(itertools.accumulate((len(text) + 1 for text in texts[:-1]), initial=0))
+        counts = [0] * len(texts)
+        tokens = cls._TOKENS
+        
+        def _replace(match: re.Match) -> str:
+            counts[bisect_right(starts, match.start()) - 1] += 1
+            return tokens[match.lastgroup]
+        
+        redacted = cls._COMBINED.sub(_replace, separator.join(texts))
+        return list(zip(redacted.split(separator), counts))
+    
+    @classmethod
+    async def redact_many_async(cls, texts: List[str], enable: bool = True) -> List[Tuple[str, int]]:
+        """
+        Redact PII from several texts in a worker thread.
+        
+        Args:
+            texts: Input texts to redact
+            enable: Whether to enable redaction (can be disabled for testing)
+            
+        Returns:
+            List of (redacted_text, redaction_count), in input order
+        """
+        if not enable:
+            return [(text, 0) for text in texts]
+        
+        return await asyncio.to_thread(cls.redact_many, texts, enable)
+    
+    @classmethod
+    def _redact_hyperscan(cls, text: str) -> Tuple[str, int]:
+        """
+        Redact PII, skipping the regex when Hyperscan finds none.
+        
+        Args:
+            text: Input text to redact
+            
+        Returns:
+            Tuple of (redacted_text, redaction_count)
+        """
+        return cls._redact_hyperscan_many([text])[0]
+    
+    @classmethod
+    def _redact_hyperscan_many(cls, texts: List[str]) -> List[Tuple[str, int]]:
+        """
+        Redact PII from several texts, prefiltered by one Hyperscan scan.
+        
+        Hyperscan picks matches leftmost-longest and reads digits, spaces
+        and word boundaries as ASCII only, so its matches just mark the
+        texts that contain PII. Those, and any text that is not ASCII, are
+        redacted with the combined regex, which keeps the output identical
+        to the re engine; the rest (most log lines) are returned as is.
+        
+        Args:
+            texts: Input texts to redact, none containing the separator
+            
+        Returns:
+            List of (redacted_text, redaction_count), in input order
+        """
+        separator = cls._BATCH_SEPARATOR.encode('utf-8')
+        encoded = [text.encode('utf-8') for text in texts]
+        
+        # Offset at which each text starts within the joined bytes
+        starts = list(itertools.accumulate((len(chunk) + 1 for chunk in encoded[:-1]), initial=0))
+        has_pii = [not text.isascii() for text in texts]
+        
+        def _on_match(pattern_id, start, end, flags, context):
+            has_pii[bisect_right(starts, end - 1) - 1] = True
+        
+        cls._HS_DB.scan(separator.join(encoded), match_event_handler=_on_match)
+        
+        tokens = cls._TOKENS
+        results = [
+            cls._COMBINED.subn(lambda match: tokens[match.lastgroup], text) if flagged else (text, 0)
+            for text, flagged in zip(texts, has_pii)
+        ]
+        logger.debug(f"Redacted {sum(count for _, count in results)} PII instances")
+        return results
+
+
+class CachedTimestamp:
+    """
+    ISO-8601 UTC timestamp string refreshed by a background task.
+    
+    Lets high-frequency endpoints (health probes) return a precomputed
+    string instead of formatting the current time on every call.
+    """
+    
+    def __init__(self, interval_seconds: float = 1.0):
+        """
+        Initialize the cached timestamp.
+        
+        Args:
+            interval_seconds: How often the cached value is refreshed
+        """
+        self.interval_seconds = interval_seconds
+        self._value = datetime.now(_UTC).isoformat()
+        self._task: Optional[asyncio.Task] = None
+    
+    @property
+    def value(self) -> str:
+        """Current timestamp, computed directly if the refresher isn't running."""
+        if self._task is None or self._task.done():
+            return datetime.now(_UTC).isoformat()
+        return self._value
+    
+    def start(self) -> None:
+        """Start refreshing on the running event loop."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._refresh_loop())
+    
+    async def _refresh_loop(self) -> None:
+        """Refresh the cached value until cancelled."""
+        while True:
+            self._value = datetime.now(_UTC).isoformat()
+            await asyncio.sleep(self.interval_seconds)
+    
+    async def close(self) -> None:
+        """Stop the background refresh."""
+        if self._task is None:
+            return
+        
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
 
 
 def normalize_tenant_id(tenant_id: str) -> str:
@@ -59,16 +287,41 @@ def normalize_tenant_id(tenant_id: str) -> str:
     Returns:
         Normalized tenant ID
     """
-    # Remove any potentially dangerous characters
-    normalized = re.sub(r'[^a-zA-Z0-9_-]', '_', tenant_id)
+    # Fast path: already-safe IDs skip the regex engine
+    stripped = tenant_id.replace('_', '').replace('-', '')
+    if stripped.isascii() and stripped.isalnum():
+        normalized = tenant_id
+    else:
+        # Remove any potentially dangerous characters
+        normalized = _TENANT_UNSAFE_RE.sub('_', tenant_id)
     
     # Ensure it doesn't start with a special character
-    if normalized and normalized[0] in ('_', '-'):
+    if normalized[:1] in ('_', '-'):
         normalized = 'tenant' + normalized
     
     return normalized.lower()
 
 
+@lru_cache(maxsize=4)
+def _iso_seconds(epoch_seconds: int) -> str:
+    """Format a whole second as an ISO-8601 UTC prefix, e.g. 2024-01-01T00:00:00."""
+    return datetime.fromtimestamp(epoch_seconds, _UTC).strftime('%Y-%m-%dT%H:%M:%S')
+
+
+def utc_now_iso() -> str:
+    """
+    Current UTC time as an ISO-8601 string with microseconds.
+    
+    Same format as datetime.now(timezone.utc).isoformat(), but only the
+    microseconds are formatted per call; the rest is cached per second.
+    
+    Returns:
+        Timestamp such as 2024-01-01T00:00:00.123456+00:00
+    """
+    seconds, micros = divmod(time.time_ns() // 1000, 1_000_000)
+    return f"{_iso_seconds(seconds)}.{micros:06d}+00:00"
+
+
 def generate_log_id(tenant_id: str, original_log_id: str = None) -> str:
     """
     Generate a unique log ID.
@@ -80,28 +333,28 @@ def generate_log_id(tenant_id: str, original_log_id: str = None) -> str:
     Returns:
         Unique log ID
     """
-    import uuid
-    from datetime import datetime
-    
     if original_log_id:
         return original_log_id
     
-    timestamp = datetime.utcnow().strftime('%Y%m%d%H%M%S')
-    unique_id = str(uuid.uuid4())[:8]
-    return f"{tenant_id}_{timestamp}_{unique_id}"
+    timestamp = datetime.now(_UTC).strftime('%Y%m%d%H%M%S')
+    return f"{tenant_id}_{timestamp}_{uuid4().hex[:8]}"
 
 
-def validate_text_size(text: str, max_size_mb: int = 10) -> bool:
+async def run_off_loop_if_large(func: Callable, payload: bytes, threshold_bytes: int, *args) -> Any:
     """
-    Validate that text size is within acceptable limits.
+    Run func(payload, *args) in a worker thread when the payload is large.
+    
+    Small payloads are handled inline since the thread hop costs more than
+    the work itself.
     
     Args:
-        text: Text to validate
-        max_size_mb: Maximum size in MB
+        func: Synchronous function to call
+        payload: Raw bytes passed as the first argument
+        threshold_bytes: Payload size above which work is offloaded
         
     Returns:
-        True if valid, False otherwise
+        Result of func
     """
-    size_bytes = len(text.encode('utf-8'))
-    max_bytes = max_size_mb * 1024 * 1024
-    return size_bytes <= max_bytes
\ No newline at end of file
+    if len(payload) > threshold_bytes:
+        return await asyncio.to_thread(func, payload, *args)
+    return func(payload, *args)
@@ -4,6 +4,7 @@ Sends 1,000 requests per minute with mixed JSON and text formats.
 """
 import asyncio
 import aiohttp
+import sys
 import time
 from datetime import datetime
 
@@ -56,48 +57,59 @@ async def load_test(total_requests=1000, concurrent=50):
         total_requests: Total number of requests to send
         concurrent: Number of concurrent requests
     """
-    print(f"\n{'='*60}")
-    print(f"LOAD TEST STARTING")
-    print(f"{'='*60}")
-    print(f"Target: {total_requests} requests")
-    print(f"Concurrency: {concurrent} requests at a time")
-    print(f"API URL: {API_URL}")
-    print(f"Started at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    print(f"{'='*60}\n")
+    separator = '=' * 60
+    
+    # Build each report once and write it in a single call
+    sys.stdout.write("\n".join([
+        "",
+        separator,
+        "LOAD TEST STARTING",
+        separator,
+        f"Target: {total_requests} requests",
+        f"Concurrency: {concurrent} requests at a time",
+        f"API URL: {API_URL}",
+        f"Started at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
+        separator,
+        "",
+        "",
+    ]))
     
     start_time = time.time()
-    results = []
     
-    # Create connector with connection pooling
-    connector = aiohttp.TCPConnector(limit=concurrent, limit_per_host=concurrent)
+    # Create connector with connection pooling; concurrency is bounded by the semaphore
+    connector = aiohttp.TCPConnector(
+        limit=0,
+        limit_per_host=concurrent * 2,
+        ttl_dns_cache=300,
+        enable_cleanup_closed=True
+    )
     timeout = aiohttp.ClientTimeout(total=30)
     
-    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
-        tasks = []
+    # Keep `concurrent` requests in flight at all times instead of waiting
+    # for each batch to finish before starting the next
+    semaphore = asyncio.Semaphore(concurrent)
+    completed = 0
+    
+    async def bounded(coro):
+        nonlocal completed
+        async with semaphore:
+            result = await coro
+        completed += 1
         
-        for i in range(total_requests):
+        # Progress update
+        if completed % 100 == 0:
+            sys.stdout.write(f"Progress: {completed}/{total_requests} requests sent...\n")
+        return result
+    
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        tasks = [
             # Alternate between JSON and text formats
-            if i % 2 == 0:
-                task = send_json_request(session, i)
-            else:
-                task = send_text_request(session, i)
-            
-            tasks.append(task)
-            
-            # Process in batches to control concurrency
-            if len(tasks) >= concurrent:
-                batch_results = await asyncio.gather(*tasks)
-                results.extend(batch_results)
-                tasks = []
-                
-                # Progress update
-                if len(results) % 100 == 0:
-                    print(f"Progress: {len(results)}/{total_requests} requests sent...")
-        
-        # Process remaining tasks
-        if tasks:
-            batch_results = await asyncio.gather(*tasks)
-            results.extend(batch_results)
+            asyncio.create_task(bounded(
+                send_json_request(session, i) if i % 2 == 0 else send_text_request(session, i)
+            ))
+            for i in range(total_requests)
+        ]
+        results = await asyncio.gather(*tasks)
     
     end_time = time.time()
     elapsed = end_time - start_time
@@ -111,25 +123,6 @@ async def load_test(total_requests=1000, concurrent=50):
     success_rate = (success_202 / total * 100) if total > 0 else 0
     rps = total / elapsed if elapsed > 0 else 0
     
-    # Print results
-    print(f"\n{'='*60}")
-    print(f"LOAD TEST RESULTS")
-    print(f"{'='*60}")
-    print(f"Total Requests:      {total}")
-    print(f"Successful (202):    {success_202} ({success_rate:.2f}%)")
-    print(f"Errors:              {errors}")
-    print(f"Other Status:        {other_status}")
-    print(f"{'='*60}")
-    print(f"Time Elapsed:        {elapsed:.2f} seconds")
-    print(f"Requests/Second:     {rps:.2f} RPS")
-    print(f"Avg Response Time:   {(elapsed/total*1000):.2f} ms")
-    print(f"{'='*60}")
-    
-    # Pass/Fail criteria
-    print(f"\n{'='*60}")
-    print(f"PASS/FAIL CRITERIA")
-    print(f"{'='*60}")
-    
     pass_criteria = {
         "Success Rate > 95%": success_rate > 95,
         "RPS > 15": rps > 15,
@@ -138,13 +131,36 @@ async def load_test(total_requests=1000, concurrent=50):
     
     all_passed = all(pass_criteria.values())
     
-    for criteria, passed in pass_criteria.items():
-        status = "✅ PASS" if passed else "❌ FAIL"
-        print(f"{criteria:<30} {status}")
-    
-    print(f"{'='*60}")
-    print(f"\nOVERALL: {'✅ PASSED' if all_passed else '❌ FAILED'}")
-    print(f"{'='*60}\n")
+    # Print results
+    sys.stdout.write("\n".join([
+        "",
+        separator,
+        "LOAD TEST RESULTS",
+        separator,
+        f"Total Requests:      {total}",
+        f"Successful (202):    {success_202} ({success_rate:.2f}%)",
+        f"Errors:              {errors}",
+        f"Other Status:        {other_status}",
+        separator,
+        f"Time Elapsed:        {elapsed:.2f} seconds",
+        f"Requests/Second:     {rps:.2f} RPS",
+        f"Avg Response Time:   {(elapsed/total*1000):.2f} ms",
+        separator,
+        "",
+        separator,
+        "PASS/FAIL CRITERIA",
+        separator,
+        *(
+            f"{criteria:<30} {'✅ PASS' if passed else '❌ FAIL'}"
+            for criteria, passed in pass_criteria.items()
+        ),
+        separator,
+        "",
+        f"OVERALL: {'✅ PASSED' if all_passed else '❌ FAILED'}",
+        separator,
+        "",
+        "",
+    ]))
     
     return results, all_passed
 
@@ -0,0 +1,59 @@
+//! Native PII redaction.
+//!
+//! Compiles the PII patterns passed from Python into a single alternation
+//! and redacts in one pass with the GIL released, so other threads keep
+//! running while a large payload is scrubbed.
+
+use pyo3::exceptions::PyValueError;
+use pyo3::prelude::*;
+use regex::{Captures, Regex};
+
+#[pyclass(frozen)]
+struct Redactor {
+    combined: Regex,
+    names: Vec<String>,
+    tokens: Vec<String>,
+}
+
+#[pymethods]
+impl Redactor {
+    /// Build a redactor from ordered (pii_type, pattern) pairs.
+    #[new]
+    fn new(patterns: Vec<(String, String)>) -> PyResult<Self> {
+        let combined = patterns
+            .iter()
+            .map(|(name, pattern)| format!("(?P<{name}>{pattern})"))
+            .collect::<Vec<_>>()
+            .join("|");
+        let combined = Regex::new(&combined).map_err(|e| PyValueError::new_err(e.to_string()))?;
+        let names = patterns.iter().map(|(name, _)| name.clone()).collect();
+        let tokens = patterns
+            .iter()
+            .map(|(name, _)| format!("[{}_REDACTED]", name.to_uppercase()))
+            .collect();
+
+        Ok(Self { combined, names, tokens })
+    }
+
+    /// Redact PII from text, returning (redacted_text, redaction_count).
+    fn redact(&self, py: Python<'_>, text: &str) -> (String, usize) {
+        py.allow_threads(|| {
+            let mut count = 0usize;
+            let redacted = self.combined.replace_all(text, |caps: &Captures| {
+                count += 1;
+                self.names
+                    .iter()
+                    .position(|name| caps.name(name).is_some())
+                    .map_or("", |index| self.tokens[index].as_str())
+                    .to_owned()
+            });
+            (redacted.into_owned(), count)
+        })
+    }
+}
+
+#[pymodule]
+fn pii_redactor(m: &Bound<'_, PyModule>) -> PyResult<()> {
+    m.add_class::<Redactor>()?;
+    Ok(())
+}
@@ -3,30 +3,331 @@ Database abstraction layer for Firestore.
 Supports both local emulator and cloud Firestore.
 """
 import os
+import time
+import base64
+import asyncio
+import itertools
 import logging
-from typing import Optional, Dict, Any
+import threading
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Optional, Dict, Any, AsyncIterator, Callable, List, Tuple
 from abc import ABC, abstractmethod
 
 logger = logging.getLogger(__name__)
 
+# gRPC status codes worth retrying per document: ABORTED (write contention),
+# UNAVAILABLE, RESOURCE_EXHAUSTED and DEADLINE_EXCEEDED
+_RETRYABLE_WRITE_CODES = frozenset({10, 14, 8, 4})
+
+# Queued by close() behind the last write; the flusher stops when it gets here
+_STOP = object()
+
+
+def _close_client(client: Any) -> None:
+    """Close a Firestore client, including the gRPC channel Client.close() leaves open."""
+    try:
+        api = getattr(client, '_firestore_api_internal', None)
+        if api is not None:
+            api.transport.close()
+        client.close()
+    except Exception as e:
+        logger.warning(f"Failed to close Firestore client: {e}")
+
+
+def encode_page_token(sort_value: str, log_id: str) -> str:
+    """
+    Build an opaque page token from the last row of a page.
+    
+    Args:
+        sort_value: Sort key of the last row (a timestamp string)
+        log_id: Log identifier of the last row
+        
+    Returns:
+        URL-safe token for fetching the next page
+    """
+    return base64.urlsafe_b64encode(f"{sort_value}|{log_id}".encode('utf-8')).decode('ascii')
+
+
+def decode_page_token(page_token: str) -> Tuple[str, str]:
+    """
+    Split a page token back into (sort_value, log_id).
+    
+    Raises:
+        ValueError: If the token is malformed
+    """
+    sort_value, sep, log_id = base64.urlsafe_b64decode(page_token).decode('utf-8').partition('|')
+    if not sep:
+        raise ValueError("Malformed page token")
+    return sort_value, log_id
+
 
 class Database(ABC):
     """Abstract base class for database implementations."""
     
+    @abstractmethod
+    async def connect(self) -> None:
+        """Open connections up front instead of on the first operation."""
+        pass
+    
     @abstractmethod
     async def save_processed_log(self, tenant_id: str, log_id: str, data: dict) -> bool:
         """Save a processed log to the database."""
         pass
     
+    async def save_processed_logs_many(self, entries: List[Tuple[str, str, dict]]) -> List[bool]:
+        """
+        Save several processed logs at once.
+        
+        Args:
+            entries: (tenant_id, log_id, data) tuples
+            
+        Returns:
+            Per-entry success flags, in input order
+        """
+        return list(await asyncio.gather(*(
+            self.save_processed_log(tenant_id, log_id, data)
+            for tenant_id, log_id, data in entries
+        )))
+    
     @abstractmethod
     async def get_processed_log(self, tenant_id: str, log_id: str) -> Optional[dict]:
         """Retrieve a processed log from the database."""
         pass
     
     @abstractmethod
-    async def list_tenant_logs(self, tenant_id: str, limit: int = 100) -> list:
+    async def list_tenant_logs(self, tenant_id: str, limit: int = 100,
+                               page_token: Optional[str] = None) -> list:
         """List all logs for a tenant."""
         pass
+    
+    @abstractmethod
+    async def list_tenant_logs_page(self, tenant_id: str, limit: int = 100,
+                                    page_token: Optional[str] = None) -> Tuple[list, Optional[str]]:
+        """List one page of a tenant's logs plus the token for the next page."""
+        pass
+    
+    async def iter_tenant_logs(self, tenant_id: str, limit: Optional[int] = None,
+                               page_size: int = 100) -> AsyncIterator[dict]:
+        """
+        Yield a tenant's logs one at a time, newest first.
+        
+        Fetches a page at a time, so memory stays bounded by page_size
+        however many logs are read.
+        
+        Args:
+            tenant_id: Tenant identifier
+            limit: Maximum number of logs to yield (None for all)
+            page_size: Logs fetched per round trip
+        """
+        remaining = limit
+        page_token = None
+        
+        while remaining is None or remaining > 0:
+            size = page_size if remaining is None else min(page_size, remaining)
+            logs, page_token = await self.list_tenant_logs_page(tenant_id, size, page_token)
+            for log in logs:
+                yield log
+            
+            if remaining is not None:
+                remaining -= len(logs)
+            if page_token is None:
+                break
+
+
+class FirestoreBatchWriter:
+    """
+    Coalesces concurrent document writes into BulkWriter batches.
+    
+    Each submit() enqueues a write and waits on its own future; a background
+    task collects up to batch_size writes (or whatever arrives within
+    max_wait_seconds), sends them with one BulkWriter in a worker thread and
+    resolves each future with that document's outcome.
+    """
+    
+    def __init__(self, get_client: Callable[[], Any], executor: Optional[Executor] = None,
+                 batch_size: int = 450, max_wait_seconds: float = 0.02,
+                 max_attempts: int = 5):
+        """
+        Initialize the batch writer.
+        
+        Args:
+            get_client: Returns the Firestore client to create each BulkWriter from
+            executor: Executor that runs the blocking BulkWriter calls
+                (defaults to the event loop's executor)
+            batch_size: Maximum writes per flush
+            max_wait_seconds: Longest a write waits for the batch to fill
+            max_attempts: Attempts per document for retryable errors
+        """
+        self.get_client = get_client
+        self.executor = executor
+        self.batch_size = batch_size
+        self.max_wait_seconds = max_wait_seconds
+        self.max_attempts = max_attempts
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+    
+    @property
+    def is_running(self) -> bool:
+        """Whether the flusher is running on the current event loop."""
+        return (
+            self._task is not None
+            and not self._task.done()
+            and self._task.get_loop() is asyncio.get_running_loop()
+        )
+    
+    def start(self) -> None:
+        """Start the background flusher on the running event loop."""
+        if self.is_running:
+            return
+        
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._flush_loop())
+        logger.info(f"Firestore batch writer started (batch_size={self.batch_size})")
+    
+    async def submit(self, doc_ref: Any, data: dict) -> bool:
+        """
+        Queue a document write and wait until its batch is committed.
+        
+        Args:
+            doc_ref: Document reference to set
+            data: Document data
+            
+        Returns:
+            True if the document was written, False otherwise
+        """
+        self.start()
+        
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((doc_ref, data, future))
+        return await future
+    
+    async def submit_many(self, writes: List[Tuple[Any, dict]]) -> List[bool]:
+        """
+        Queue several document writes together and wait for all of them.
+        
+        Args:
+            writes: (doc_ref, data) pairs
+            
+        Returns:
+            Per-write success flags, in input order
+        """
+        self.start()
+        
+        loop = asyncio.get_running_loop()
+        futures = []
+        for doc_ref, data in writes:
+            future = loop.create_future()
+            self._queue.put_nowait((doc_ref, data, future))
+            futures.append(future)
+        return list(await asyncio.gather(*futures))
+    
+    async def _flush_loop(self) -> None:
+        """Collect writes into batches and flush them until close() stops it."""
+        loop = asyncio.get_running_loop()
+        stopping = False
+        
+        while not stopping:
+            write = await self._queue.get()
+            if write is _STOP:
+                break
+            batch = [write]
+            deadline = loop.time() + self.max_wait_seconds
+            
+            while len(batch) < self.batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    write = await asyncio.wait_for(self._queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+                if write is _STOP:
+                    stopping = True
+                    break
+                batch.append(write)
+            
+            await self._flush(batch)
+    
+    async def _flush(self, batch: List[Tuple[Any, dict, asyncio.Future]]) -> None:
+        """Write a batch in a worker thread and resolve its futures."""
+        loop = asyncio.get_running_loop()
+        
+        try:
+            results = await loop.run_in_executor(
+                self.executor, self._bulk_write, [(doc_ref, data) for doc_ref, data, _ in batch]
+            )
+        except Exception as e:
+            logger.error(f"Firestore batch of {len(batch)} writes failed: {e}")
+            results = {}
+        
+        for doc_ref, _, future in batch:
+            if not future.done():
+                future.set_result(results.get(doc_ref.path, False))
+    
+    def _bulk_write(self, writes: List[Tuple[Any, dict]]) -> Dict[str, bool]:
+        """
+        Send writes with a single BulkWriter (blocking).
+        
+        Args:
+            writes: (document reference, data) pairs; for repeated documents
+                the last write wins, matching sequential set() calls
+            
+        Returns:
+            Mapping of document path to whether it was written
+        """
+        latest = {doc_ref.path: (doc_ref, data) for doc_ref, data in writes}
+        results: Dict[str, bool] = {}
+        
+        def on_result(doc_ref, result, bulk_writer) -> None:
+            results[doc_ref.path] = True
+        
+        def on_error(failure, bulk_writer) -> bool:
+            if (failure.code in _RETRYABLE_WRITE_CODES
+                    and failure.attempts < self.max_attempts):
+                return True
+            
+            logger.error(
+                f"Failed to write {failure.operation.reference.path}: {failure.message}"
+            )
+            results[failure.operation.reference.path] = False
+            return False
+        
+        bulk_writer = self.get_client().bulk_writer()
+        bulk_writer.on_write_result(on_result)
+        bulk_writer.on_write_error(on_error)
+        
+        for doc_ref, data in latest.values():
+            bulk_writer.set(doc_ref, data)
+        bulk_writer.close()
+        
+        return results
+    
+    async def close(self) -> None:
+        """
+        Stop the flusher after writing anything still queued.
+        
+        The flusher is never cancelled: it finishes the batch it is
+        writing, works through the queue up to a stop marker and returns,
+        so every submitted write has its future resolved.
+        """
+        if self._task is None:
+            return
+        
+        if not self._task.done():
+            self._queue.put_nowait(_STOP)
+            await self._task
+        self._task = None
+        
+        # Writes submitted while the flusher was winding down
+        pending = []
+        while not self._queue.empty():
+            write = self._queue.get_nowait()
+            if write is not _STOP:
+                pending.append(write)
+        if pending:
+            await self._flush(pending)
+        
+        logger.info("Firestore batch writer stopped")
 
 
 class FirestoreDatabase(Database):
@@ -35,37 +336,122 @@ class FirestoreDatabase(Database):
     Schema: tenants/{tenant_id}/processed_logs/{log_id}
     """
     
-    def __init__(self, use_emulator: bool = False, emulator_host: str = "localhost:8080"):
+    def __init__(self, use_emulator: bool = False, emulator_host: str = "localhost:8080",
+                 max_workers: int = 40, pool_size: Optional[int] = None,
+                 client_refresh_seconds: float = 50 * 60):
         """
         Initialize Firestore database.
         
         Args:
             use_emulator: Whether to use Firestore emulator
             emulator_host: Emulator host and port
+            max_workers: Threads for blocking Firestore calls
+            pool_size: Number of Firestore clients (defaults to the
+                FIRESTORE_POOL_SIZE environment variable, or 8)
+            client_refresh_seconds: Lifetime of each client before it is
+                replaced with a fresh one
         """
         self.use_emulator = use_emulator
         self.emulator_host = emulator_host
-        self._db = None
+        self.pool_size = pool_size or int(os.getenv('FIRESTORE_POOL_SIZE', '8'))
+        self.client_refresh_seconds = client_refresh_seconds
+        # Independent clients each hold their own gRPC channel, so in-flight
+        # RPCs spread over several HTTP/2 connections instead of queueing
+        # behind one connection's stream limit
+        self._clients: List[Any] = []
+        self._rr = itertools.count()
+        self._refresh_index = 0
+        self._next_refresh = 0.0
+        # Rotation runs on whichever thread picks a client (including the
+        # BulkWriter's executor threads), so it is serialized here
+        self._refresh_lock = threading.Lock()
+        self._retired_client: Optional[Any] = None
+        # The Firestore client is synchronous; its calls run here so they
+        # don't block the event loop
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="firestore")
+        self._batcher: Optional[FirestoreBatchWriter] = None
+        self._init_lock = asyncio.Lock()
         self._initialized = False
     
-    def _initialize(self) -> None:
-        """Initialize Firestore client."""
+    async def _initialize(self) -> None:
+        """
+        Initialize the Firestore client pool.
+        
+        Callers check self._initialized before calling, so once set up an
+        operation skips the call entirely. Each client does its own
+        credential and channel setup, so they are built in the executor,
+        side by side, rather than on the event loop.
+        """
         if self._initialized:
             return
         
-        from google.cloud import firestore
+        async with self._init_lock:
+            if self._initialized:
+                return
+            
+            from google.cloud import firestore
+            
+            if self.use_emulator:
+                os.environ['FIRESTORE_EMULATOR_HOST'] = self.emulator_host
+                logger.info(f"Using Firestore emulator at {self.emulator_host}")
+            
+            try:
+                loop = asyncio.get_running_loop()
+                self._clients = list(await asyncio.gather(
+                    *(loop.run_in_executor(self._pool, firestore.Client) for _ in range(self.pool_size))
+                ))
+                self._next_refresh = time.monotonic() + self.client_refresh_seconds / self.pool_size
+                self._batcher = FirestoreBatchWriter(self._client, executor=self._pool)
+                self._initialized = True
+                logger.info(f"Firestore client pool initialized ({self.pool_size} clients)")
+            except Exception as e:
+                logger.error(f"Failed to initialize Firestore: {e}")
+                raise
+    
+    async def connect(self) -> None:
+        """Create the client pool and batch writer ahead of the first request."""
+        if not self._initialized:
+            await self._initialize()
+    
+    def _client(self) -> Any:
+        """
+        Pick the next client round-robin.
+        
+        Clients are replaced one at a time, staggered across the refresh
+        interval, so at most one connection is ever close to being reaped
+        by the front end.
+        """
+        if time.monotonic() >= self._next_refresh:
+            self._refresh_client()
         
-        if self.use_emulator:
-            os.environ['FIRESTORE_EMULATOR_HOST'] = self.emulator_host
-            logger.info(f"Using Firestore emulator at {self.emulator_host}")
+        return self._clients[next(self._rr) % len(self._clients)]
+    
+    def _refresh_client(self) -> None:
+        """
+        Replace the oldest client with a newly built one.
         
-        try:
-            self._db = firestore.Client()
-            self._initialized = True
-            logger.info("Firestore client initialized")
-        except Exception as e:
-            logger.error(f"Failed to initialize Firestore: {e}")
-            raise
+        The replaced client may still be serving calls that picked it
+        just before, so it is closed one rotation later, once those
+        have long finished.
+        """
+        from google.cloud import firestore
+        
+        with self._refresh_lock:
+            # Another thread may have rotated while this one waited
+            if time.monotonic() < self._next_refresh:
+                return
+            
+            self._next_refresh = time.monotonic() + self.client_refresh_seconds / self.pool_size
+            try:
+                new_client = firestore.Client()
+            except Exception as e:
+                logger.warning(f"Failed to refresh Firestore client: {e}")
+            else:
+                if self._retired_client is not None:
+                    _close_client(self._retired_client)
+                self._retired_client = self._clients[self._refresh_index]
+                self._clients[self._refresh_index] = new_client
+            self._refresh_index = (self._refresh_index + 1) % len(self._clients)
     
     async def save_processed_log(self, tenant_id: str, log_id: str, data: dict) -> bool:
         """
@@ -80,11 +466,12 @@ class FirestoreDatabase(Database):
             True if successful, False otherwise
         """
         try:
-            self._initialize()
+            if not self._initialized:
+                await self._initialize()
             
             # Multi-tenant path: tenants/{tenant_id}/processed_logs/{log_id}
             doc_ref = (
-                self._db
+                self._client()
                 .collection('tenants')
                 .document(tenant_id)
                 .collection('processed_logs')
@@ -92,8 +479,10 @@ class FirestoreDatabase(Database):
             )
             
             # Use set with merge=False to ensure idempotency
-            # If document exists, it will be overwritten (idempotent)
-            doc_ref.set(data)
+            # If document exists, it will be overwritten (idempotent).
+            # Concurrent saves are coalesced into one BulkWriter batch.
+            if not await self._batcher.submit(doc_ref, data):
+                return False
             
             logger.info(f"Saved log to Firestore: tenant={tenant_id}, log_id={log_id}")
             return True
@@ -102,6 +491,33 @@ class FirestoreDatabase(Database):
             logger.error(f"Failed to save to Firestore: {e}")
             return False
     
+    async def save_processed_logs_many(self, entries: List[Tuple[str, str, dict]]) -> List[bool]:
+        """
+        Save several processed logs, queued to the batch writer together.
+        
+        Args:
+            entries: (tenant_id, log_id, data) tuples
+            
+        Returns:
+            Per-entry success flags, in input order
+        """
+        try:
+            if not self._initialized:
+                await self._initialize()
+            
+            tenants = self._client().collection('tenants')
+            results = await self._batcher.submit_many([
+                (tenants.document(tenant_id).collection('processed_logs').document(log_id), data)
+                for tenant_id, log_id, data in entries
+            ])
+            
+            logger.info(f"Saved {sum(results)}/{len(entries)} logs to Firestore")
+            return results
+        
+        except Exception as e:
+            logger.error(f"Failed to save to Firestore: {e}")
+            return [False] * len(entries)
+    
     async def get_processed_log(self, tenant_id: str, log_id: str) -> Optional[dict]:
         """
         Retrieve a processed log for a specific tenant.
@@ -114,17 +530,18 @@ class FirestoreDatabase(Database):
             Log data if found, None otherwise
         """
         try:
-            self._initialize()
+            if not self._initialized:
+                await self._initialize()
             
             doc_ref = (
-                self._db
+                self._client()
                 .collection('tenants')
                 .document(tenant_id)
                 .collection('processed_logs')
                 .document(log_id)
             )
             
-            doc = doc_ref.get()
+            doc = await asyncio.get_running_loop().run_in_executor(self._pool, doc_ref.get)
             
             if doc.exists:
                 logger.info(f"Retrieved log: tenant={tenant_id}, log_id={log_id}")
@@ -137,64 +554,136 @@ class FirestoreDatabase(Database):
             logger.error(f"Failed to retrieve from Firestore: {e}")
             return None
     
-    async def list_tenant_logs(self, tenant_id: str, limit: int = 100) -> list:
+    async def list_tenant_logs(self, tenant_id: str, limit: int = 100,
+                               page_token: Optional[str] = None) -> list:
         """
         List all processed logs for a tenant.
         
         Args:
             tenant_id: Tenant identifier
             limit: Maximum number of logs to return
+            page_token: Token from a previous page to continue after
             
         Returns:
             List of log documents
         """
+        logs, _ = await self.list_tenant_logs_page(tenant_id, limit, page_token)
+        return logs
+    
+    async def list_tenant_logs_page(self, tenant_id: str, limit: int = 100,
+                                    page_token: Optional[str] = None) -> Tuple[list, Optional[str]]:
+        """
+        List one page of a tenant's logs, newest first.
+        
+        Pages are keyset-paginated on (processed_at, document id), so each
+        page costs the same however deep it is.
+        
+        Args:
+            tenant_id: Tenant identifier
+            limit: Maximum number of logs to return
+            page_token: Token from a previous page to continue after
+            
+        Returns:
+            Tuple of (log documents, token for the next page or None)
+        """
         try:
-            self._initialize()
+            if not self._initialized:
+                await self._initialize()
             
-            collection_ref = (
-                self._db
+            from google.cloud import firestore
+            
+            query = (
+                self._client()
                 .collection('tenants')
                 .document(tenant_id)
                 .collection('processed_logs')
-                .limit(limit)
+                .order_by('processed_at', direction=firestore.Query.DESCENDING)
+                .order_by('__name__', direction=firestore.Query.DESCENDING)
             )
             
-            docs = collection_ref.stream()
+            if page_token:
+                processed_at, log_id = decode_page_token(page_token)
+                query = query.start_after({'processed_at': processed_at, '__name__': log_id})
+            
+            # Materialize the stream in the worker thread
+            docs = await asyncio.get_running_loop().run_in_executor(
+                self._pool, lambda: list(query.limit(limit).stream())
+            )
             logs = [doc.to_dict() for doc in docs]
             
+            next_token = None
+            if len(docs) == limit:
+                last = docs[-1]
+                next_token = encode_page_token(last.get('processed_at'), last.id)
+            
             logger.info(f"Retrieved {len(logs)} logs for tenant={tenant_id}")
-            return logs
+            return logs, next_token
             
         except Exception as e:
             logger.error(f"Failed to list logs: {e}")
-            return []
+            return [], None
     
-    async def verify_tenant_isolation(self, tenant_id: str) -> Dict[str, Any]:
+    async def verify_tenant_isolation(self, tenant_id: str, max_leaks: int = 50) -> Dict[str, Any]:
         """
         Verify that tenant data is properly isolated.
         Returns statistics about the tenant's data.
         
+        A document leaks when it doesn't name the tenant it is stored
+        under, including documents with no tenant_id at all. Firestore
+        can't query for a missing field, so the total and the number of
+        documents that do name this tenant come from two server-side
+        count() aggregations issued concurrently; the leak count is the
+        difference. Leaking documents are only scanned for, and at most
+        max_leaks returned, when that count is non-zero.
+        
         Args:
             tenant_id: Tenant identifier
+            max_leaks: Maximum leaking documents to return
             
         Returns:
             Dictionary with isolation verification data
         """
         try:
-            self._initialize()
+            if not self._initialized:
+                await self._initialize()
+            
+            from google.cloud.firestore_v1.base_query import FieldFilter
             
-            logs = await self.list_tenant_logs(tenant_id, limit=1000)
+            collection_ref = (
+                self._client()
+                .collection('tenants')
+                .document(tenant_id)
+                .collection('processed_logs')
+            )
+            owned_query = collection_ref.where(filter=FieldFilter('tenant_id', '==', tenant_id))
+            loop = asyncio.get_running_loop()
             
-            # Verify all logs belong to this tenant
-            other_tenant_logs = [
-                log for log in logs 
-                if log.get('tenant_id') != tenant_id
-            ]
+            total_result, owned_result = await asyncio.gather(
+                loop.run_in_executor(self._pool, collection_ref.count().get),
+                loop.run_in_executor(self._pool, owned_query.count().get)
+            )
+            total_logs = total_result[0][0].value
+            leak_count = total_logs - owned_result[0][0].value
+            
+            other_tenant_logs = []
+            if leak_count > 0:
+                def fetch_leaks() -> list:
+                    leaks = []
+                    for doc in collection_ref.stream():
+                        data = doc.to_dict()
+                        if data.get('tenant_id') != tenant_id:
+                            leaks.append(data)
+                            if len(leaks) >= max_leaks:
+                                break
+                    return leaks
+                
+                other_tenant_logs = await loop.run_in_executor(self._pool, fetch_leaks)
             
             return {
                 'tenant_id': tenant_id,
-                'total_logs': len(logs),
-                'isolation_violated': len(other_tenant_logs) > 0,
+                'total_logs': total_logs,
+                'isolation_violated': leak_count > 0,
+                'cross_tenant_leak_count': leak_count,
                 'cross_tenant_leaks': other_tenant_logs
             }
             
@@ -204,6 +693,19 @@ class FirestoreDatabase(Database):
                 'tenant_id': tenant_id,
                 'error': str(e)
             }
+    
+    async def close(self) -> None:
+        """Flush pending writes, close the clients and release the worker threads."""
+        if self._batcher:
+            await self._batcher.close()
+        self._pool.shutdown(wait=False)
+        
+        with self._refresh_lock:
+            for client in self._clients + [self._retired_client]:
+                if client is not None:
+                    _close_client(client)
+            self._clients = []
+            self._retired_client = None
 
 
 def get_database(use_emulator: bool = False, emulator_host: str = "localhost:8080", 
@@ -2,25 +2,46 @@
 Message Queue abstraction layer.
 Supports Redis (local) and Google Cloud Pub/Sub (cloud).
 """
-import json
+import zlib
 import logging
+import itertools
 from abc import ABC, abstractmethod
-from typing import Optional, Callable, Any
+from typing import Optional, Callable, Any, Dict, Iterable, List, Set, Tuple, Union
 import asyncio
 
+import orjson
+
 logger = logging.getLogger(__name__)
 
 
+def _encode(message: Union[dict, bytes]) -> bytes:
+    """Serialize a message to JSON bytes, passing pre-encoded bytes through."""
+    if isinstance(message, bytes):
+        return message
+    return orjson.dumps(message)
+
+
 class MessageQueue(ABC):
     """Abstract base class for message queue implementations."""
     
     @abstractmethod
-    async def publish(self, message: dict) -> bool:
+    async def connect(self) -> None:
+        """Establish the underlying client connection."""
+        pass
+    
+    @abstractmethod
+    async def publish(self, message: Union[dict, bytes]) -> bool:
         """Publish a message to the queue."""
         pass
     
     @abstractmethod
-    async def subscribe(self, callback: Callable[[dict], Any]) -> None:
+    async def publish_many(self, messages: List[Union[dict, bytes]]) -> bool:
+        """Publish a batch of messages to the queue."""
+        pass
+    
+    @abstractmethod
+    async def subscribe(self, callback: Callable[[Any], Any], decode: bool = True,
+                        batch: bool = False) -> None:
         """Subscribe to messages and process them with callback."""
         pass
     
@@ -33,8 +54,12 @@ class MessageQueue(ABC):
 class RedisMessageQueue(MessageQueue):
     """Redis-based message queue for local development."""
     
+    # Values per RPUSH command; keeps single commands small for large batches
+    RPUSH_CHUNK_SIZE = 1000
+    
     def __init__(self, host: str = "localhost", port: int = 6379, 
-                 db: int = 0, queue_name: str = "log-ingestion"):
+                 db: int = 0, queue_name: str = "log-ingestion",
+                 max_concurrency: int = 10, shard_count: int = 1):
         """
         Initialize Redis message queue.
         
@@ -43,11 +68,22 @@ class RedisMessageQueue(MessageQueue):
             port: Redis port
             db: Redis database number
             queue_name: Name of the queue (Redis list)
+            max_concurrency: Maximum messages processed at once by subscribe
+            shard_count: Number of lists the queue is spread over; with more
+                than one, messages go to queue_name:<shard> by tenant
         """
         self.host = host
         self.port = port
         self.db = db
         self.queue_name = queue_name
+        self.dead_letter_queue = f"{queue_name}:dlq"
+        self.max_concurrency = max_concurrency
+        self.shard_count = max(1, shard_count)
+        self.shard_keys = (
+            [queue_name] if self.shard_count == 1
+            else [f"{queue_name}:{shard}" for shard in range(self.shard_count)]
+        )
+        self._next_shard = itertools.count()
         self._client: Optional[Any] = None
         self._is_connected = False
     
@@ -58,10 +94,9 @@ class RedisMessageQueue(MessageQueue):
         
         try:
             import redis.asyncio as aioredis
+            # Messages are JSON bytes end to end, so skip response decoding
             self._client = await aioredis.from_url(
-                f"redis://{self.host}:{self.port}/{self.db}",
-                encoding="utf-8",
-                decode_responses=True
+                f"redis://{self.host}:{self.port}/{self.db}"
             )
             # Test connection
             await self._client.ping()
@@ -71,56 +106,143 @@ class RedisMessageQueue(MessageQueue):
             logger.error(f"Failed to connect to Redis: {e}")
             raise
     
-    async def publish(self, message: dict) -> bool:
+    def _shard_key(self, message: Union[dict, bytes]) -> str:
+        """
+        Pick the list a message goes to.
+        
+        Messages of one tenant share a shard (crc32 is stable across
+        processes, unlike hash()); pre-encoded bytes carry no readable
+        tenant and are spread round-robin.
+        """
+        if self.shard_count == 1:
+            return self.queue_name
+        
+        if isinstance(message, dict):
+            shard = zlib.crc32(str(message.get('tenant_id', '')).encode('utf-8'))
+        else:
+            shard = next(self._next_shard)
+        return self.shard_keys[shard % self.shard_count]
+    
+    async def publish(self, message: Union[dict, bytes]) -> bool:
         """
         Publish a message to Redis queue.
         
         Args:
-            message: Dictionary to publish
+            message: Dictionary to publish, or already-encoded JSON bytes
             
         Returns:
             True if successful, False otherwise
         """
         try:
             await self.connect()
-            message_json = json.dumps(message)
-            await self._client.rpush(self.queue_name, message_json)
-            logger.info(f"Published message to {self.queue_name}: log_id={message.get('log_id')}")
+            key = self._shard_key(message)
+            await self._client.rpush(key, _encode(message))
+            logger.info(f"Published message to {key}")
             return True
         except Exception as e:
             logger.error(f"Failed to publish message: {e}")
             return False
     
-    async def subscribe(self, callback: Callable[[dict], Any], 
-                       poll_interval: float = 0.1) -> None:
+    async def publish_many(self, messages: List[Union[dict, bytes]]) -> bool:
+        """
+        Publish a batch of messages to Redis queue in one round trip.
+        
+        Messages are split into multi-value RPUSH commands of at most
+        RPUSH_CHUNK_SIZE values, all sent in a single pipeline.
+        
+        Args:
+            messages: Dictionaries or already-encoded JSON bytes to publish
+            
+        Returns:
+            True if successful, False otherwise
+        """
+        if not messages:
+            return True
+        
+        try:
+            await self.connect()
+            payloads_by_key: Dict[str, List[bytes]] = {}
+            for message in messages:
+                payloads_by_key.setdefault(self._shard_key(message), []).append(_encode(message))
+            
+            async with self._client.pipeline(transaction=False) as pipe:
+                for key, payloads in payloads_by_key.items():
+                    for start in range(0, len(payloads), self.RPUSH_CHUNK_SIZE):
+                        pipe.rpush(key, *payloads[start:start + self.RPUSH_CHUNK_SIZE])
+                await pipe.execute()
+            logger.info(f"Published {len(messages)} messages to {self.queue_name}")
+            return True
+        except Exception as e:
+            logger.error(f"Failed to publish {len(messages)} messages: {e}")
+            return False
+    
+    async def subscribe(self, callback: Callable[[Any], Any], decode: bool = True,
+                       batch: bool = False, block_timeout: int = 5, batch_size: int = 32,
+                       shard_ids: Optional[Iterable[int]] = None) -> None:
         """
         Subscribe to messages and process them.
         
+        Each round blocks on BLPOP for the first message, then takes up to
+        batch_size - 1 more with a single LPOP, and runs the callbacks
+        concurrently (at most max_concurrency at a time), or hands the
+        whole round to one batch callback. Messages whose callback fails
+        are moved to the dead-letter queue.
+        
         Args:
-            callback: Async function to call with each message
-            poll_interval: Time to wait between polls (seconds)
+            callback: Async function to call with each message, or with
+                the list of messages in a round when batch is set
+            decode: Pass the callback a decoded dictionary; when False it
+                gets the raw JSON bytes and can decode them itself
+            batch: Call callback once per round with the list of messages
+                taken; it returns (position in that list, error) pairs for
+                the ones that failed
+            block_timeout: Seconds each BLPOP blocks waiting for a message
+            batch_size: Maximum messages taken per round trip
+            shard_ids: Shards this subscriber consumes (default: all); the
+                legacy unsharded list is always consumed as well
         """
         await self.connect()
-        logger.info(f"Started subscribing to {self.queue_name}")
+        
+        keys = (
+            self.shard_keys if shard_ids is None
+            else [self.shard_keys[shard] for shard in shard_ids]
+        )
+        if self.shard_count > 1:
+            # Also drain the unsharded list, which still holds whatever was
+            # queued before sharding was turned on
+            keys = keys + [self.queue_name]
+        logger.info(f"Started subscribing to {', '.join(keys)}")
+        
+        semaphore = asyncio.Semaphore(self.max_concurrency)
         
         while True:
             try:
-                # BLPOP: Blocking left pop with timeout
-                result = await self._client.blpop(self.queue_name, timeout=1)
+                # BLPOP: Blocking left pop with timeout; it serves the first
+                # non-empty key, so rotate the order to keep shards fair
+                result = await self._client.blpop(keys, timeout=block_timeout)
+                keys = keys[1:] + keys[:1]
+                if not result:
+                    continue
                 
-                if result:
-                    _, message_json = result
-                    message = json.loads(message_json)
-                    logger.info(f"Received message: log_id={message.get('log_id')}")
-                    
-                    # Process message with callback
-                    try:
-                        await callback(message)
-                    except Exception as e:
-                        logger.error(f"Error processing message: {e}")
-                        # In production, would push to dead-letter queue
+                key, raw_message = result
+                raw_messages = [raw_message]
+                if batch_size > 1:
+                    # LPOP with a count drains what's already queued in one call
+                    more = await self._client.lpop(key, batch_size - 1)
+                    if more:
+                        raw_messages.extend(more)
                 
-                await asyncio.sleep(poll_interval)
+                if batch:
+                    failures = await self._dispatch_batch(callback, raw_messages, decode)
+                else:
+                    failures = [
+                        failure for failure in await asyncio.gather(*(
+                            self._dispatch(callback, raw_message, semaphore, decode)
+                            for raw_message in raw_messages
+                        ))
+                        if failure is not None
+                    ]
+                await self._dead_letter(failures)
                 
             except asyncio.CancelledError:
                 logger.info("Subscription cancelled")
@@ -129,6 +251,78 @@ class RedisMessageQueue(MessageQueue):
                 logger.error(f"Error in subscription loop: {e}")
                 await asyncio.sleep(1)  # Back off on error
     
+    async def _dispatch(self, callback: Callable[[Any], Any], raw_message: bytes,
+                        semaphore: asyncio.Semaphore,
+                        decode: bool) -> Optional[Tuple[bytes, Exception]]:
+        """
+        Decode and process one message.
+        
+        Returns:
+            (raw_message, error) if the callback failed, None otherwise
+        """
+        async with semaphore:
+            try:
+                if decode:
+                    message = orjson.loads(raw_message)
+                    logger.info(f"Received message: log_id={message.get('log_id')}")
+                    await callback(message)
+                else:
+                    await callback(raw_message)
+            except Exception as e:
+                logger.error(f"Error processing message: {e}")
+                return raw_message, e
+        return None
+    
+    async def _dispatch_batch(self, callback: Callable[[Any], Any], raw_messages: List[bytes],
+                              decode: bool) -> List[Tuple[bytes, Exception]]:
+        """
+        Decode a round of messages and process them with one callback call.
+        
+        Returns:
+            (raw_message, error) for every message that failed
+        """
+        failures = []
+        if decode:
+            messages, raws = [], []
+            for raw_message in raw_messages:
+                try:
+                    messages.append(orjson.loads(raw_message))
+                    raws.append(raw_message)
+                except Exception as e:
+                    logger.error(f"Error decoding message: {e}")
+                    failures.append((raw_message, e))
+        else:
+            messages = raws = raw_messages
+        
+        if not messages:
+            return failures
+        
+        try:
+            failed = await callback(messages) or []
+        except Exception as e:
+            logger.error(f"Error processing batch of {len(messages)} messages: {e}")
+            return failures + [(raw_message, e) for raw_message in raws]
+        
+        failures.extend((raws[position], error) for position, error in failed)
+        return failures
+    
+    async def _dead_letter(self, failures: List[Tuple[bytes, Exception]]) -> None:
+        """Push failed messages and their errors onto the dead-letter queue in one RPUSH."""
+        if not failures:
+            return
+        
+        try:
+            entries = [
+                orjson.dumps({
+                    'message': raw_message.decode('utf-8', errors='replace'),
+                    'error': str(error)
+                })
+                for raw_message, error in failures
+            ]
+            await self._client.rpush(self.dead_letter_queue, *entries)
+        except Exception as e:
+            logger.error(f"Failed to dead-letter {len(failures)} messages: {e}")
+    
     async def close(self) -> None:
         """Close Redis connection."""
         if self._client:
@@ -152,44 +346,122 @@ class PubSubMessageQueue(MessageQueue):
         self.topic_name = topic_name
         self._publisher = None
         self._subscriber = None
+        self._topic_path: Optional[str] = None
+        self._pending: Set[Any] = set()
+    
+    async def connect(self) -> None:
+        """Create the Pub/Sub publisher client."""
+        if self._publisher:
+            return
+        
+        from google.cloud import pubsub_v1
+        
+        # Let the client batch messages into shared Publish RPCs; flow
+        # control bounds how many can be in flight at once
+        self._publisher = pubsub_v1.PublisherClient(
+            batch_settings=pubsub_v1.types.BatchSettings(
+                max_messages=100,
+                max_bytes=1_000_000,
+                max_latency=0.01,
+            ),
+            publisher_options=pubsub_v1.types.PublisherOptions(
+                enable_message_ordering=False,
+                flow_control=pubsub_v1.types.PublishFlowControl(
+                    message_limit=10_000,
+                    limit_exceeded_behavior=pubsub_v1.types.LimitExceededBehavior.ERROR,
+                ),
+            ),
+        )
+        self._topic_path = self._publisher.topic_path(self.project_id, self.topic_name)
+        logger.info(f"Pub/Sub publisher ready for topic {self.topic_name}")
+    
+    def _on_published(self, future: Any) -> None:
+        """Forget a finished publish future, logging failures."""
+        self._pending.discard(future)
+        error = future.exception()
+        if error:
+            logger.error(f"Failed to publish to Pub/Sub: {error}")
     
-    async def publish(self, message: dict) -> bool:
+    async def publish(self, message: Union[dict, bytes]) -> bool:
         """
         Publish a message to Pub/Sub.
         
+        Returns once the client has accepted the message; it is sent with
+        the client's next batch. Call flush() to wait for delivery.
+        
         Args:
-            message: Dictionary to publish
+            message: Dictionary to publish, or already-encoded JSON bytes
             
         Returns:
-            True if successful, False otherwise
+            True if accepted, False otherwise
         """
         try:
-            from google.cloud import pubsub_v1
-            
-            if not self._publisher:
-                self._publisher = pubsub_v1.PublisherClient()
+            await self.connect()
             
-            topic_path = self._publisher.topic_path(self.project_id, self.topic_name)
-            message_json = json.dumps(message)
-            future = self._publisher.publish(topic_path, message_json.encode('utf-8'))
-            future.result()  # Wait for publish to complete
+            future = self._publisher.publish(self._topic_path, _encode(message))
+            self._pending.add(future)
+            future.add_done_callback(self._on_published)
             
-            logger.info(f"Published message to Pub/Sub: log_id={message.get('log_id')}")
+            logger.info(f"Queued message for Pub/Sub topic {self.topic_name}")
             return True
         except Exception as e:
             logger.error(f"Failed to publish to Pub/Sub: {e}")
             return False
     
-    async def subscribe(self, callback: Callable[[dict], Any]) -> None:
+    async def publish_many(self, messages: List[Union[dict, bytes]]) -> bool:
+        """
+        Publish a batch of messages to Pub/Sub.
+        
+        All messages are handed to the client before waiting, so the
+        client can send them in as few Publish RPCs as possible. The wait
+        happens on the event loop rather than blocking it.
+        
+        Args:
+            messages: Dictionaries or already-encoded JSON bytes to publish
+            
+        Returns:
+            True if successful, False otherwise
+        """
+        if not messages:
+            return True
+        
+        try:
+            await self.connect()
+            
+            futures = [
+                self._publisher.publish(self._topic_path, _encode(message))
+                for message in messages
+            ]
+            await asyncio.gather(*(asyncio.wrap_future(future) for future in futures))
+            
+            logger.info(f"Published {len(messages)} messages to Pub/Sub topic {self.topic_name}")
+            return True
+        except Exception as e:
+            logger.error(f"Failed to publish {len(messages)} messages to Pub/Sub: {e}")
+            return False
+    
+    async def flush(self) -> None:
+        """Wait for every message accepted by publish() to be sent."""
+        pending = list(self._pending)
+        if pending:
+            await asyncio.gather(
+                *(asyncio.wrap_future(future) for future in pending),
+                return_exceptions=True
+            )
+    
+    async def subscribe(self, callback: Callable[[Any], Any], decode: bool = True,
+                        batch: bool = False) -> None:
         """Subscribe to Pub/Sub messages."""
         # For Cloud Run, this is handled by push subscriptions
         # This method is not used in production
         pass
     
     async def close(self) -> None:
-        """Close Pub/Sub connections."""
+        """Flush pending publishes and close Pub/Sub connections."""
         if self._publisher:
-            self._publisher = None
+            await self.flush()
+            publisher, self._publisher = self._publisher, None
+            await asyncio.get_running_loop().run_in_executor(None, publisher.stop)
         if self._subscriber:
             self._subscriber = None
 
@@ -210,7 +482,9 @@ def get_message_queue(queue_type: str, **kwargs) -> MessageQueue:
             host=kwargs.get('host', 'localhost'),
             port=kwargs.get('port', 6379),
             db=kwargs.get('db', 0),
-            queue_name=kwargs.get('queue_name', 'log-ingestion')
+            queue_name=kwargs.get('queue_name', 'log-ingestion'),
+            max_concurrency=kwargs.get('max_concurrency', 10),
+            shard_count=kwargs.get('shard_count', 1)
         )
     elif queue_type == "pubsub":
         return PubSubMessageQueue(
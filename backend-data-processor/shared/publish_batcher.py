@@ -0,0 +1,143 @@
+"""
+Publish batching for the ingestion path.
+Coalesces messages from concurrent requests into batched queue publishes.
+"""
+import asyncio
+import logging
+from typing import Optional, Union
+
+from shared.message_queue import MessageQueue
+
+logger = logging.getLogger(__name__)
+
+# Queued by close() behind the last message; the flusher stops when it gets here
+_STOP = object()
+
+
+class PublishBatcher:
+    """
+    Buffers messages in memory and publishes them in batches.
+    
+    Requests enqueue without waiting on the network; a background task
+    drains whatever has accumulated (up to batch_size) and publishes it
+    with a single publish_many call. Callers were already told their
+    messages were accepted, so a failed batch is retried before it is
+    given up on.
+    """
+    
+    def __init__(self, message_queue: MessageQueue, batch_size: int = 256,
+                 max_pending: int = 10_000, max_attempts: int = 3,
+                 retry_delay_seconds: float = 0.5):
+        """
+        Initialize the publish batcher.
+        
+        Args:
+            message_queue: Queue to publish batches to
+            batch_size: Maximum messages per publish_many call
+            max_pending: Maximum buffered messages before rejecting new ones
+            max_attempts: Publish attempts per batch before it is dropped
+            retry_delay_seconds: Delay before the first retry, doubled after
+                each further failure
+        """
+        self.message_queue = message_queue
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+        self.retry_delay_seconds = retry_delay_seconds
+        self._buffer: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+    
+    @property
+    def is_running(self) -> bool:
+        """Whether the background flusher is accepting messages."""
+        return self._task is not None and not self._task.done() and not self._stopping
+    
+    def start(self) -> None:
+        """Start the background flusher on the running event loop."""
+        if self.is_running:
+            return
+        
+        self._buffer = asyncio.Queue(maxsize=self.max_pending)
+        self._stopping = False
+        self._task = asyncio.create_task(self._flush_loop())
+        logger.info(f"Publish batcher started (batch_size={self.batch_size})")
+    
+    async def publish(self, message: Union[dict, bytes]) -> bool:
+        """
+        Queue a message for publishing.
+        
+        Publishes directly when the flusher isn't running (e.g. outside
+        the app lifespan, or while it is shutting down).
+        
+        Args:
+            message: Dictionary or already-encoded JSON bytes
+            
+        Returns:
+            True if accepted, False if the buffer is full or publish failed
+        """
+        if not self.is_running:
+            return await self.message_queue.publish(message)
+        
+        try:
+            self._buffer.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            logger.warning(f"Publish buffer full ({self.max_pending} messages)")
+            return False
+    
+    async def _flush_loop(self) -> None:
+        """Drain the buffer and publish in batches until close() stops it."""
+        stopping = False
+        while not stopping:
+            batch = [await self._buffer.get()]
+            batch.extend(self._drain(self.batch_size - 1))
+            
+            # Nothing is queued after the stop marker, so it always ends a batch
+            if batch[-1] is _STOP:
+                batch.pop()
+                stopping = True
+            if batch:
+                await self._publish_batch(batch)
+    
+    def _drain(self, limit: int) -> list:
+        """Take up to limit messages already in the buffer without waiting."""
+        batch = []
+        while len(batch) < limit and not self._buffer.empty():
+            batch.append(self._buffer.get_nowait())
+        return batch
+    
+    async def _publish_batch(self, batch: list) -> None:
+        """Publish a batch, retrying with backoff before dropping it."""
+        delay = self.retry_delay_seconds
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                if await self.message_queue.publish_many(batch):
+                    return
+            except Exception as e:
+                logger.warning(f"Publishing batch of {len(batch)} messages raised: {e}")
+            
+            if attempt < self.max_attempts:
+                logger.warning(
+                    f"Publish of {len(batch)} messages failed "
+                    f"(attempt {attempt}/{self.max_attempts}), retrying in {delay}s"
+                )
+                await asyncio.sleep(delay)
+                delay *= 2
+        
+        logger.error(f"Dropped batch of {len(batch)} messages after {self.max_attempts} publish attempts")
+    
+    async def close(self) -> None:
+        """Stop the flusher once everything buffered, including an in-flight batch, is published."""
+        if self._task is None:
+            return
+        
+        # New messages publish directly from here on; the flusher works
+        # through the buffer up to the stop marker and returns
+        self._stopping = True
+        if not self._task.done():
+            await self._buffer.put(_STOP)
+            await self._task
+        self._task = None
+        
+        logger.info("Publish batcher stopped")
@@ -2,15 +2,282 @@
 SQLite-based database for local development.
 Mimics Firestore multi-tenant structure without Docker networking issues.
 """
-import json
+import time
+import asyncio
+import itertools
 import logging
-import sqlite3
 import aiosqlite
-from typing import Optional, Dict, Any
+import msgpack
+import orjson
+import zstandard as zstd
+from typing import Optional, Dict, Any, AsyncIterator, List, Tuple
 from pathlib import Path
 
+from shared.database import encode_page_token, decode_page_token
+
 logger = logging.getLogger(__name__)
 
+# Every zstd frame starts with this magic number; rows written before
+# payloads were compressed hold plain JSON instead
+_ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+# Compression dictionary is trained once enough rows exist to sample
+_ZDICT_SIZE = 100_000
+_ZDICT_MIN_SAMPLES = 1000
+
+# Queued by close() behind the last save; the flusher stops when it gets here
+_STOP = object()
+
+
+def _msgpack_default(obj: Any) -> Any:
+    """Encode values msgpack doesn't know natively (datetimes as ISO strings)."""
+    if hasattr(obj, 'isoformat'):
+        return obj.isoformat()
+    raise TypeError(f"Cannot serialize {type(obj).__name__}")
+
+
+class MissingDictionaryError(ValueError):
+    """A payload was compressed with a dictionary the codec hasn't loaded."""
+    
+    def __init__(self, dict_id: int):
+        super().__init__(f"Payload needs unknown compression dictionary {dict_id}")
+        self.dict_id = dict_id
+
+
+class PayloadCodec:
+    """
+    Encodes log payloads as zstd-compressed msgpack.
+    
+    Log documents repeat the same keys and similar values, so a shared
+    compression dictionary shrinks small payloads far more than
+    compressing each one on its own. Every frame records the id of the
+    dictionary it was written with, and rows are decoded with that one;
+    the dictionaries themselves are stored in the database (see
+    SQLiteDatabase._prepare_codec), never in a separate file.
+    """
+    
+    def __init__(self, level: int = 3):
+        """
+        Initialize the codec.
+        
+        Args:
+            level: zstd compression level
+        """
+        self.level = level
+        self._dict_id = 0
+        self._compressor = zstd.ZstdCompressor(level=level)
+        # Keyed by the dictionary id in each frame header; 0 means none
+        self._decompressors: Dict[int, zstd.ZstdDecompressor] = {0: zstd.ZstdDecompressor()}
+    
+    @property
+    def has_dictionary(self) -> bool:
+        """Whether new payloads are compressed with a trained dictionary."""
+        return self._dict_id != 0
+    
+    def add_dictionary(self, dict_bytes: bytes, use_for_encoding: bool = False) -> int:
+        """
+        Register a dictionary for decoding, optionally compressing with it too.
+        
+        Args:
+            dict_bytes: Serialized zstd dictionary
+            use_for_encoding: Compress new payloads with this dictionary
+            
+        Returns:
+            The dictionary's id
+        """
+        dict_data = zstd.ZstdCompressionDict(dict_bytes)
+        dict_id = dict_data.dict_id()
+        self._decompressors[dict_id] = zstd.ZstdDecompressor(dict_data=dict_data)
+        if use_for_encoding:
+            self._dict_id = dict_id
+            self._compressor = zstd.ZstdCompressor(level=self.level, dict_data=dict_data)
+        return dict_id
+    
+    @staticmethod
+    def train_dictionary(samples: List[dict]) -> Optional[bytes]:
+        """
+        Train a dictionary from sample payloads.
+        
+        Args:
+            samples: Decoded payloads to train on
+            
+        Returns:
+            Serialized dictionary, or None if there are too few samples
+        """
+        if len(samples) < _ZDICT_MIN_SAMPLES:
+            return None
+        
+        packed = [msgpack.packb(sample, default=_msgpack_default) for sample in samples]
+        return zstd.train_dictionary(_ZDICT_SIZE, packed).as_bytes()
+    
+    def encode(self, data: dict) -> bytes:
+        """Serialize and compress a payload."""
+        return self._compressor.compress(msgpack.packb(data, default=_msgpack_default))
+    
+    def decode(self, blob: Any) -> dict:
+        """
+        Decompress and deserialize a payload, accepting legacy JSON rows.
+        
+        Raises:
+            MissingDictionaryError: If the payload was written with a
+                dictionary this codec doesn't have
+        """
+        if isinstance(blob, bytes) and blob.startswith(_ZSTD_MAGIC):
+            dict_id = zstd.get_frame_parameters(blob).dict_id
+            decompressor = self._decompressors.get(dict_id)
+            if decompressor is None:
+                raise MissingDictionaryError(dict_id)
+            return msgpack.unpackb(decompressor.decompress(blob), raw=False)
+        return orjson.loads(blob)
+
+
+# SQL is kept in module constants so every call hands sqlite3 the same
+# string and hits the connection's prepared-statement cache
+_SQL_CREATE_TABLE = """
+    CREATE TABLE IF NOT EXISTS processed_logs (
+        tenant_id TEXT NOT NULL,
+        log_id TEXT NOT NULL,
+        ts INTEGER NOT NULL DEFAULT 0,
+        payload_tenant_id TEXT,
+        data BLOB NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (tenant_id, log_id)
+    )
+"""
+
+# Index for faster tenant queries
+_SQL_CREATE_TENANT_INDEX = """
+    CREATE INDEX IF NOT EXISTS idx_tenant_id 
+    ON processed_logs(tenant_id)
+"""
+
+# Covers metadata listing and serves keyset pagination in list order
+_SQL_CREATE_META_INDEX = """
+    CREATE INDEX IF NOT EXISTS idx_meta
+    ON processed_logs(tenant_id, ts DESC, log_id DESC)
+"""
+
+# Lets isolation checks count mismatched payloads without decoding rows
+_SQL_CREATE_PAYLOAD_TENANT_INDEX = """
+    CREATE INDEX IF NOT EXISTS idx_payload_tenant
+    ON processed_logs(tenant_id, payload_tenant_id)
+"""
+
+# Per-tenant row counts kept current by triggers, so stats never scan
+# processed_logs
+_SQL_CREATE_STATS_TABLE = """
+    CREATE TABLE IF NOT EXISTS tenant_stats (
+        tenant_id TEXT PRIMARY KEY,
+        log_count INTEGER NOT NULL
+    ) WITHOUT ROWID
+"""
+
+_SQL_CREATE_STATS_INSERT_TRIGGER = """
+    CREATE TRIGGER IF NOT EXISTS trg_stats_insert AFTER INSERT ON processed_logs
+    BEGIN
+        INSERT INTO tenant_stats (tenant_id, log_count) VALUES (NEW.tenant_id, 1)
+        ON CONFLICT (tenant_id) DO UPDATE SET log_count = log_count + 1;
+    END
+"""
+
+_SQL_CREATE_STATS_DELETE_TRIGGER = """
+    CREATE TRIGGER IF NOT EXISTS trg_stats_delete AFTER DELETE ON processed_logs
+    BEGIN
+        UPDATE tenant_stats SET log_count = log_count - 1 WHERE tenant_id = OLD.tenant_id;
+    END
+"""
+
+_SQL_BACKFILL_STATS = """
+    INSERT INTO tenant_stats (tenant_id, log_count)
+    SELECT tenant_id, COUNT(*) FROM processed_logs GROUP BY tenant_id
+"""
+
+# Upsert for idempotency; ts is milliseconds since the epoch. Unlike
+# INSERT OR REPLACE, a rewrite is an UPDATE, so the stats triggers only
+# count new rows
+_SQL_INSERT = """
+    INSERT INTO processed_logs 
+    (tenant_id, log_id, ts, payload_tenant_id, data)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT (tenant_id, log_id) DO UPDATE SET
+        ts = excluded.ts,
+        payload_tenant_id = excluded.payload_tenant_id,
+        data = excluded.data,
+        updated_at = CURRENT_TIMESTAMP
+"""
+
+_SQL_GET = """
+    SELECT data FROM processed_logs
+    WHERE tenant_id = ? AND log_id = ?
+"""
+
+_SQL_LIST_TENANT = """
+    SELECT data, ts, log_id FROM processed_logs
+    WHERE tenant_id = ?
+    ORDER BY ts DESC, log_id DESC
+    LIMIT ?
+"""
+
+_SQL_ITER_TENANT = """
+    SELECT data FROM processed_logs
+    WHERE tenant_id = ?
+    ORDER BY ts DESC, log_id DESC
+    LIMIT ?
+"""
+
+_SQL_LIST_TENANT_AFTER = """
+    SELECT data, ts, log_id FROM processed_logs
+    WHERE tenant_id = ? AND (ts, log_id) < (?, ?)
+    ORDER BY ts DESC, log_id DESC
+    LIMIT ?
+"""
+
+# Answered from idx_meta alone; never touches the data column
+_SQL_LIST_TENANT_META = """
+    SELECT log_id, ts FROM processed_logs
+    WHERE tenant_id = ?
+    ORDER BY ts DESC, log_id DESC
+    LIMIT ?
+"""
+
+# Compression dictionaries, kept with the rows that need them. The first
+# one stored is used for all new payloads
+_SQL_CREATE_ZDICTS_TABLE = """
+    CREATE TABLE IF NOT EXISTS zdicts (
+        dict_id INTEGER PRIMARY KEY,
+        data BLOB NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+_SQL_LIST_ZDICTS = "SELECT data FROM zdicts ORDER BY created_at, dict_id"
+
+_SQL_INSERT_ZDICT = """
+    INSERT INTO zdicts (dict_id, data)
+    SELECT ?, ? WHERE NOT EXISTS (SELECT 1 FROM zdicts)
+"""
+
+_SQL_SAMPLE_PAYLOADS = "SELECT data FROM processed_logs ORDER BY ts DESC LIMIT ?"
+
+_SQL_TENANTS = "SELECT tenant_id FROM tenant_stats WHERE log_count > 0"
+
+_SQL_STATS = "SELECT COALESCE(SUM(log_count), 0), COUNT(*) FROM tenant_stats WHERE log_count > 0"
+
+_SQL_COUNT_TENANT_LOGS = "SELECT log_count FROM tenant_stats WHERE tenant_id = ?"
+
+# A payload that doesn't name the tenant the row is stored under; IS NOT
+# also catches payloads without a tenant_id, which prove nothing
+_SQL_LEAK_FILTER = """
+    FROM processed_logs
+    WHERE tenant_id = ?
+    AND payload_tenant_id IS NOT tenant_id
+"""
+
+_SQL_COUNT_LEAKS = "SELECT COUNT(*)" + _SQL_LEAK_FILTER
+
+_SQL_LIST_LEAKS = "SELECT data" + _SQL_LEAK_FILTER + "LIMIT ?"
+
 
 class SQLiteDatabase:
     """
@@ -18,53 +285,240 @@ class SQLiteDatabase:
     Mimics Firestore structure: tenants/{tenant_id}/processed_logs/{log_id}
     """
     
-    def __init__(self, db_path: str = "/app/data/logs.db"):
+    def __init__(self, db_path: str = "/app/data/logs.db", write_batch_size: int = 256,
+                 write_max_wait_seconds: float = 0.005, read_pool_size: int = 8):
         """
         Initialize SQLite database.
         
         Args:
-            db_path: Path to SQLite database file
+            db_path: Path to SQLite database file, or ":memory:"
+            write_batch_size: Maximum rows committed in one transaction
+            write_max_wait_seconds: Longest a save waits for its batch to fill
+            read_pool_size: Number of read-only connections queries are spread
+                over; an in-memory database can't be shared between
+                connections, so it reads through the writer instead
         """
         self.db_path = db_path
+        self.write_batch_size = write_batch_size
+        self.write_max_wait_seconds = write_max_wait_seconds
+        self.in_memory = db_path in ("", ":memory:")
+        self.read_pool_size = 0 if self.in_memory else read_pool_size
+        # Only the flusher writes through _conn, so there is never more than
+        # one write transaction and never a "database is locked" retry;
+        # queries go through their own connections and read WAL snapshots
+        self._conn: Optional[aiosqlite.Connection] = None
+        self._read_conns: List[aiosqlite.Connection] = []
+        self._read_rr = itertools.count()
+        self._lock = asyncio.Lock()
+        self._write_queue: Optional[asyncio.Queue] = None
+        self._flusher: Optional[asyncio.Task] = None
+        self._codec = PayloadCodec()
         self._initialized = False
         
         # Ensure directory exists
-        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        if not self.in_memory:
+            Path(db_path).parent.mkdir(parents=True, exist_ok=True)
     
     async def _initialize(self) -> None:
-        """Initialize database schema."""
+        """
+        Initialize database schema.
+        
+        Callers check self._initialized before calling, so once set up an
+        operation costs one attribute read instead of creating and
+        awaiting a coroutine.
+        """
         if self._initialized:
             return
         
-        try:
-            async with aiosqlite.connect(self.db_path) as db:
-                # Create table with multi-tenant structure
-                await db.execute("""
-                    CREATE TABLE IF NOT EXISTS processed_logs (
-                        tenant_id TEXT NOT NULL,
-                        log_id TEXT NOT NULL,
-                        data TEXT NOT NULL,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        PRIMARY KEY (tenant_id, log_id)
-                    )
-                """)
+        async with self._lock:
+            if self._initialized:
+                return
+            
+            try:
+                # One long-lived connection in autocommit mode; WAL lets readers
+                # proceed while a write is in progress
+                self._conn = await aiosqlite.connect(
+                    self.db_path, isolation_level=None, cached_statements=256
+                )
+                await self._conn.execute("PRAGMA journal_mode=WAL")
+                await self._conn.execute("PRAGMA synchronous=NORMAL")
+                await self._conn.execute("PRAGMA temp_store=MEMORY")
+                await self._conn.execute("PRAGMA cache_size=-65536")
+                await self._conn.execute("PRAGMA mmap_size=268435456")
+                
+                await self._conn.execute(_SQL_CREATE_TABLE)
+                await self._migrate_schema()
+                
+                await self._conn.execute(_SQL_CREATE_TENANT_INDEX)
+                await self._conn.execute(_SQL_CREATE_META_INDEX)
+                await self._conn.execute(_SQL_CREATE_PAYLOAD_TENANT_INDEX)
+                await self._create_stats()
+                
+                await self._conn.execute(_SQL_CREATE_ZDICTS_TABLE)
+                await self._prepare_codec()
+                
+                self._read_conns = list(await asyncio.gather(
+                    *(self._open_reader() for _ in range(self.read_pool_size))
+                ))
                 
-                # Create index for faster tenant queries
-                await db.execute("""
-                    CREATE INDEX IF NOT EXISTS idx_tenant_id 
-                    ON processed_logs(tenant_id)
-                """)
+                self._write_queue = asyncio.Queue()
+                self._flusher = asyncio.create_task(self._flush_loop())
                 
-                await db.commit()
+                self._initialized = True
+                logger.info(f"SQLite database initialized at {self.db_path}")
             
-            self._initialized = True
-            logger.info(f"SQLite database initialized at {self.db_path}")
+            except Exception as e:
+                logger.error(f"Failed to initialize SQLite database: {e}")
+                # Each aiosqlite connection owns a thread that would
+                # otherwise keep the interpreter from exiting
+                for conn in [self._conn, *self._read_conns]:
+                    if conn is not None:
+                        await conn.close()
+                self._conn = None
+                self._read_conns = []
+                raise
+    
+    async def connect(self) -> None:
+        """Open the connections and prepare the schema ahead of the first operation."""
+        if not self._initialized:
+            await self._initialize()
+    
+    async def _open_reader(self) -> aiosqlite.Connection:
+        """Open a read-only connection for the read pool."""
+        # mode=ro skips journal setup for writing and only ever takes
+        # shared locks
+        uri = f"{Path(self.db_path).resolve().as_uri()}?mode=ro"
+        conn = await aiosqlite.connect(uri, uri=True, isolation_level=None, cached_statements=256)
+        await conn.execute("PRAGMA temp_store=MEMORY")
+        await conn.execute("PRAGMA cache_size=-16384")
+        await conn.execute("PRAGMA mmap_size=268435456")
+        return conn
+    
+    def _reader(self) -> aiosqlite.Connection:
+        """Pick the next read connection, round-robin (the writer when there is no pool)."""
+        if not self._read_conns:
+            return self._conn
+        return self._read_conns[next(self._read_rr) % len(self._read_conns)]
+    
+    async def _migrate_schema(self) -> None:
+        """
+        Bring tables from the original JSON-text layout up to the columnar one.
         
-        except Exception as e:
-            logger.error(f"Failed to initialize SQLite database: {e}")
+        Hot fields (ts, payload_tenant_id) became real columns so listing
+        and isolation checks don't read or parse the data blob. Older
+        tables are altered in place and the new columns backfilled once.
+        """
+        async with self._conn.execute("PRAGMA table_info(processed_logs)") as cursor:
+            columns = {row[1] for row in await cursor.fetchall()}
+        
+        if 'payload_tenant_id' not in columns:
+            logger.info("Migrating processed_logs: adding payload_tenant_id column")
+            await self._conn.execute("ALTER TABLE processed_logs ADD COLUMN payload_tenant_id TEXT")
+            await self._conn.execute(
+                "UPDATE processed_logs SET payload_tenant_id = json_extract(data, '$.tenant_id')"
+            )
+        
+        if 'ts' not in columns:
+            logger.info("Migrating processed_logs: adding ts column")
+            await self._conn.execute(
+                "ALTER TABLE processed_logs ADD COLUMN ts INTEGER NOT NULL DEFAULT 0"
+            )
+            await self._conn.execute(
+                "UPDATE processed_logs SET ts = CAST(strftime('%s', updated_at) AS INTEGER) * 1000"
+            )
+    
+    async def _create_stats(self) -> None:
+        """Create the stats table and its triggers, backfilling existing rows once."""
+        async with self._conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'tenant_stats'"
+        ) as cursor:
+            exists = await cursor.fetchone() is not None
+        
+        await self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            await self._conn.execute(_SQL_CREATE_STATS_TABLE)
+            if not exists:
+                await self._conn.execute(_SQL_BACKFILL_STATS)
+            await self._conn.execute(_SQL_CREATE_STATS_INSERT_TRIGGER)
+            await self._conn.execute(_SQL_CREATE_STATS_DELETE_TRIGGER)
+            await self._conn.commit()
+        except Exception:
+            await self._conn.rollback()
             raise
     
+    async def _load_dictionaries(self, conn: Optional[aiosqlite.Connection] = None) -> None:
+        """
+        Register every stored dictionary with the codec, encoding with the first.
+        
+        Args:
+            conn: Connection to read them through (default: the writer)
+        """
+        async with (conn or self._conn).execute(_SQL_LIST_ZDICTS) as cursor:
+            rows = await cursor.fetchall()
+        for index, (dict_bytes,) in enumerate(rows):
+            self._codec.add_dictionary(dict_bytes, use_for_encoding=index == 0)
+    
+    async def _decode_all(self, blobs: List[Any]) -> List[dict]:
+        """
+        Decode payloads in order.
+        
+        A row compressed with a dictionary another process stored after
+        this one connected triggers one reload of the dictionaries, read
+        through the async reader.
+        """
+        try:
+            return [self._codec.decode(blob) for blob in blobs]
+        except MissingDictionaryError:
+            await self._load_dictionaries(self._reader())
+            return [self._codec.decode(blob) for blob in blobs]
+    
+    async def _store_dictionary(self, dict_bytes: bytes) -> None:
+        """
+        Store a dictionary unless one already exists, then reload.
+        
+        When another process stored one first, the insert is a no-op and
+        this process switches to that dictionary, so all writers agree.
+        """
+        dict_id = zstd.ZstdCompressionDict(dict_bytes).dict_id()
+        await self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            await self._conn.execute(_SQL_INSERT_ZDICT, (dict_id, dict_bytes))
+            await self._conn.commit()
+        except Exception:
+            await self._conn.rollback()
+            raise
+        await self._load_dictionaries()
+    
+    async def _prepare_codec(self) -> None:
+        """
+        Load the stored compression dictionary, training one if enough rows exist.
+        
+        Opening the database never depends on this: rows that can't be
+        decoded are left out of the sample, and any failure just leaves
+        new payloads compressed without a dictionary.
+        """
+        try:
+            await self._load_dictionaries()
+            if self._codec.has_dictionary:
+                return
+            
+            async with self._conn.execute(_SQL_SAMPLE_PAYLOADS, (_ZDICT_MIN_SAMPLES,)) as cursor:
+                rows = await cursor.fetchall()
+            samples = []
+            for (blob,) in rows:
+                try:
+                    samples.append(self._codec.decode(blob))
+                except Exception:
+                    continue
+            
+            dict_bytes = await asyncio.to_thread(PayloadCodec.train_dictionary, samples)
+            if dict_bytes is not None:
+                await self._store_dictionary(dict_bytes)
+                logger.info(f"Trained compression dictionary from {len(samples)} payloads")
+        
+        except Exception as e:
+            logger.warning(f"Compression dictionary unavailable, compressing without one: {e}")
+    
     async def save_processed_log(self, tenant_id: str, log_id: str, data: dict) -> bool:
         """
         Save a processed log with strict multi-tenant isolation.
@@ -78,20 +532,19 @@ class SQLiteDatabase:
             True if successful, False otherwise
         """
         try:
-            await self._initialize()
+            if not self._initialized:
+                await self._initialize()
             
-            # Serialize data to JSON
-            data_json = json.dumps(data)
+            # Compress the payload; fields that are queried on get their
+            # own columns
+            blob = self._codec.encode(data)
+            row = (tenant_id, log_id, data.get('tenant_id'), blob)
             
-            async with aiosqlite.connect(self.db_path) as db:
-                # Use INSERT OR REPLACE for idempotency
-                await db.execute("""
-                    INSERT OR REPLACE INTO processed_logs 
-                    (tenant_id, log_id, data, updated_at)
-                    VALUES (?, ?, ?, CURRENT_TIMESTAMP)
-                """, (tenant_id, log_id, data_json))
-                
-                await db.commit()
+            # Hand the row to the flusher, which commits it with its batch
+            future = asyncio.get_running_loop().create_future()
+            await self._write_queue.put((row, future))
+            if not await future:
+                return False
             
             logger.info(f"Saved log to SQLite: tenant={tenant_id}, log_id={log_id}")
             return True
@@ -100,6 +553,104 @@ class SQLiteDatabase:
             logger.error(f"Failed to save to SQLite: {e}")
             return False
     
+    async def save_processed_logs_many(self, entries: List[Tuple[str, str, dict]]) -> List[bool]:
+        """
+        Save several processed logs, queued to the flusher together so
+        they share a transaction.
+        
+        Args:
+            entries: (tenant_id, log_id, data) tuples
+            
+        Returns:
+            Per-entry success flags, in input order
+        """
+        try:
+            if not self._initialized:
+                await self._initialize()
+            
+            loop = asyncio.get_running_loop()
+            futures = []
+            for tenant_id, log_id, data in entries:
+                future = loop.create_future()
+                row = (tenant_id, log_id, data.get('tenant_id'), self._codec.encode(data))
+                self._write_queue.put_nowait((row, future))
+                futures.append(future)
+            results = list(await asyncio.gather(*futures))
+            
+            logger.info(f"Saved {sum(results)}/{len(entries)} logs to SQLite")
+            return results
+        
+        except Exception as e:
+            logger.error(f"Failed to save to SQLite: {e}")
+            return [False] * len(entries)
+    
+    async def _flush_loop(self) -> None:
+        """Collect queued saves and commit them in batches until close() stops it."""
+        loop = asyncio.get_running_loop()
+        stopping = False
+        
+        while not stopping:
+            item = await self._write_queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = loop.time() + self.write_max_wait_seconds
+            
+            while len(batch) < self.write_batch_size:
+                # Rows already queued (e.g. from save_processed_logs_many)
+                # are taken directly; only an empty queue waits on a timer
+                if not self._write_queue.empty():
+                    item = self._write_queue.get_nowait()
+                else:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._write_queue.get(), remaining)
+                    except asyncio.TimeoutError:
+                        break
+                
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            
+            await self._write_batch(batch)
+    
+    async def _write_batch(self, batch: List[Tuple[tuple, asyncio.Future]]) -> None:
+        """
+        Commit a batch of rows in one transaction and resolve their futures.
+        
+        If the transaction fails, rows are retried one at a time so a single
+        bad row doesn't fail the whole batch.
+        """
+        ts = time.time_ns() // 1_000_000
+        rows = [
+            (tenant_id, log_id, ts, payload_tenant_id, blob)
+            for (tenant_id, log_id, payload_tenant_id, blob), _ in batch
+        ]
+        
+        try:
+            await self._conn.execute("BEGIN")
+            await self._conn.executemany(_SQL_INSERT, rows)
+            await self._conn.commit()
+            results = [True] * len(batch)
+        except Exception as e:
+            logger.warning(f"Batch insert of {len(batch)} rows failed, retrying per row: {e}")
+            await self._conn.rollback()
+            results = []
+            for row in rows:
+                try:
+                    await self._conn.execute(_SQL_INSERT, row)
+                    results.append(True)
+                except Exception as row_error:
+                    logger.error(f"Failed to save to SQLite: {row_error}")
+                    results.append(False)
+        
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+    
     async def get_processed_log(self, tenant_id: str, log_id: str) -> Optional[dict]:
         """
         Retrieve a processed log for a specific tenant.
@@ -112,55 +663,134 @@ class SQLiteDatabase:
             Log data if found, None otherwise
         """
         try:
-            await self._initialize()
+            if not self._initialized:
+                await self._initialize()
             
-            async with aiosqlite.connect(self.db_path) as db:
-                async with db.execute("""
-                    SELECT data FROM processed_logs
-                    WHERE tenant_id = ? AND log_id = ?
-                """, (tenant_id, log_id)) as cursor:
-                    row = await cursor.fetchone()
-                    
-                    if row:
-                        logger.info(f"Retrieved log: tenant={tenant_id}, log_id={log_id}")
-                        return json.loads(row[0])
-                    else:
-                        logger.warning(f"Log not found: tenant={tenant_id}, log_id={log_id}")
-                        return None
+            db = self._reader()
+            async with db.execute(_SQL_GET, (tenant_id, log_id)) as cursor:
+                row = await cursor.fetchone()
+                
+                if row:
+                    logger.info(f"Retrieved log: tenant={tenant_id}, log_id={log_id}")
+                    return (await self._decode_all([row[0]]))[0]
+                else:
+                    logger.warning(f"Log not found: tenant={tenant_id}, log_id={log_id}")
+                    return None
         
         except Exception as e:
             logger.error(f"Failed to retrieve from SQLite: {e}")
             return None
     
-    async def list_tenant_logs(self, tenant_id: str, limit: int = 100) -> list:
+    async def list_tenant_logs(self, tenant_id: str, limit: int = 100,
+                               page_token: Optional[str] = None) -> list:
         """
         List all processed logs for a tenant.
         
         Args:
             tenant_id: Tenant identifier
             limit: Maximum number of logs to return
+            page_token: Token from a previous page to continue after
             
         Returns:
             List of log documents
         """
+        logs, _ = await self.list_tenant_logs_page(tenant_id, limit, page_token)
+        return logs
+    
+    async def list_tenant_logs_page(self, tenant_id: str, limit: int = 100,
+                                    page_token: Optional[str] = None) -> Tuple[list, Optional[str]]:
+        """
+        List one page of a tenant's logs, newest first.
+        
+        Pages are keyset-paginated on (ts, log_id) rather than
+        OFFSET, so each page costs the same however deep it is.
+        
+        Args:
+            tenant_id: Tenant identifier
+            limit: Maximum number of logs to return
+            page_token: Token from a previous page to continue after
+            
+        Returns:
+            Tuple of (log documents, token for the next page or None)
+        """
         try:
-            await self._initialize()
+            if not self._initialized:
+                await self._initialize()
             
-            async with aiosqlite.connect(self.db_path) as db:
-                async with db.execute("""
-                    SELECT data FROM processed_logs
-                    WHERE tenant_id = ?
-                    ORDER BY updated_at DESC
-                    LIMIT ?
-                """, (tenant_id, limit)) as cursor:
-                    rows = await cursor.fetchall()
-                    logs = [json.loads(row[0]) for row in rows]
+            db = self._reader()
+            if page_token:
+                last_ts, last_log_id = decode_page_token(page_token)
+                cursor = await db.execute(
+                    _SQL_LIST_TENANT_AFTER, (tenant_id, int(last_ts), last_log_id, limit)
+                )
+            else:
+                cursor = await db.execute(_SQL_LIST_TENANT, (tenant_id, limit))
+            
+            async with cursor:
+                rows = await cursor.fetchall()
+            logs = await self._decode_all([row[0] for row in rows])
+            
+            next_token = None
+            if len(rows) == limit:
+                next_token = encode_page_token(str(rows[-1][1]), rows[-1][2])
             
             logger.info(f"Retrieved {len(logs)} logs for tenant={tenant_id}")
-            return logs
+            return logs, next_token
         
         except Exception as e:
             logger.error(f"Failed to list logs: {e}")
+            return [], None
+    
+    async def iter_tenant_logs(self, tenant_id: str,
+                               limit: Optional[int] = None) -> AsyncIterator[dict]:
+        """
+        Yield a tenant's logs one at a time, newest first.
+        
+        Rows are streamed from the cursor and decoded as they are consumed,
+        so memory stays flat and the first log arrives without waiting for
+        the rest; stopping early stops reading.
+        
+        Args:
+            tenant_id: Tenant identifier
+            limit: Maximum number of logs to yield (None for all)
+        """
+        if not self._initialized:
+            await self._initialize()
+        
+        async with self._reader().execute(_SQL_ITER_TENANT, (tenant_id, limit or -1)) as cursor:
+            # aiosqlite fetches in chunks of 64 rows behind this iterator
+            async for row in cursor:
+                try:
+                    log = self._codec.decode(row[0])
+                except MissingDictionaryError:
+                    await self._load_dictionaries(self._reader())
+                    log = self._codec.decode(row[0])
+                yield log
+    
+    async def list_tenant_logs_metadata(self, tenant_id: str, limit: int = 100) -> List[Dict[str, Any]]:
+        """
+        List a tenant's log ids and timestamps, newest first.
+        
+        Served from the covering index without reading any payloads.
+        
+        Args:
+            tenant_id: Tenant identifier
+            limit: Maximum number of entries to return
+            
+        Returns:
+            List of {'log_id', 'ts'} dictionaries (ts in epoch milliseconds)
+        """
+        try:
+            if not self._initialized:
+                await self._initialize()
+            
+            async with self._reader().execute(_SQL_LIST_TENANT_META, (tenant_id, limit)) as cursor:
+                rows = await cursor.fetchall()
+            
+            return [{'log_id': log_id, 'ts': ts} for log_id, ts in rows]
+        
+        except Exception as e:
+            logger.error(f"Failed to list log metadata: {e}")
             return []
     
     async def get_all_tenants(self) -> list:
@@ -171,42 +801,56 @@ class SQLiteDatabase:
             List of tenant IDs
         """
         try:
-            await self._initialize()
+            if not self._initialized:
+                await self._initialize()
             
-            async with aiosqlite.connect(self.db_path) as db:
-                async with db.execute("""
-                    SELECT DISTINCT tenant_id FROM processed_logs
-                """) as cursor:
-                    rows = await cursor.fetchall()
-                    return [row[0] for row in rows]
+            db = self._reader()
+            async with db.execute(_SQL_TENANTS) as cursor:
+                rows = await cursor.fetchall()
+                return [row[0] for row in rows]
         
         except Exception as e:
             logger.error(f"Failed to get tenants: {e}")
             return []
     
-    async def verify_tenant_isolation(self, tenant_id: str) -> Dict[str, Any]:
+    async def verify_tenant_isolation(self, tenant_id: str, max_leaks: int = 50) -> Dict[str, Any]:
         """
         Verify that tenant data is properly isolated.
         
+        Counts are computed in SQL; a row is a leak when its payload does
+        not name the tenant it is stored under (including payloads with no
+        tenant_id at all). Only leaking rows (at most max_leaks) are
+        fetched and decoded.
+        
         Args:
             tenant_id: Tenant identifier
+            max_leaks: Maximum leaking documents to return
             
         Returns:
             Dictionary with isolation verification data
         """
         try:
-            logs = await self.list_tenant_logs(tenant_id, limit=1000)
+            if not self._initialized:
+                await self._initialize()
+            
+            db = self._reader()
+            async with db.execute(_SQL_COUNT_TENANT_LOGS, (tenant_id,)) as cursor:
+                row = await cursor.fetchone()
+                total_logs = row[0] if row else 0
             
-            # Verify all logs belong to this tenant
-            other_tenant_logs = [
-                log for log in logs 
-                if log.get('tenant_id') != tenant_id
-            ]
+            async with db.execute(_SQL_COUNT_LEAKS, (tenant_id,)) as cursor:
+                leak_count = (await cursor.fetchone())[0]
+            
+            other_tenant_logs = []
+            if leak_count:
+                async with db.execute(_SQL_LIST_LEAKS, (tenant_id, max_leaks)) as cursor:
+                    other_tenant_logs = await self._decode_all([row[0] for row in await cursor.fetchall()])
             
             return {
                 'tenant_id': tenant_id,
-                'total_logs': len(logs),
-                'isolation_violated': len(other_tenant_logs) > 0,
+                'total_logs': total_logs,
+                'isolation_violated': leak_count > 0,
+                'cross_tenant_leak_count': leak_count,
                 'cross_tenant_leaks': other_tenant_logs
             }
         
@@ -225,16 +869,12 @@ class SQLiteDatabase:
             Dictionary with database stats
         """
         try:
-            await self._initialize()
+            if not self._initialized:
+                await self._initialize()
             
-            async with aiosqlite.connect(self.db_path) as db:
-                # Total logs
-                async with db.execute("SELECT COUNT(*) FROM processed_logs") as cursor:
-                    total_logs = (await cursor.fetchone())[0]
-                
-                # Total tenants
-                async with db.execute("SELECT COUNT(DISTINCT tenant_id) FROM processed_logs") as cursor:
-                    total_tenants = (await cursor.fetchone())[0]
+            # Both totals come from the trigger-maintained stats table
+            async with self._reader().execute(_SQL_STATS) as cursor:
+                total_logs, total_tenants = await cursor.fetchone()
             
             return {
                 'total_logs': total_logs,
@@ -245,3 +885,37 @@ class SQLiteDatabase:
         except Exception as e:
             logger.error(f"Failed to get stats: {e}")
             return {}
+    
+    async def close(self) -> None:
+        """
+        Commit any queued saves and close the database connections.
+        
+        The flusher is never cancelled, since that could leave a batch's
+        transaction open and its callers waiting forever. It finishes the
+        batch it is writing, commits everything queued ahead of a stop
+        marker and returns.
+        """
+        if self._flusher is not None:
+            if not self._flusher.done():
+                self._write_queue.put_nowait(_STOP)
+                await self._flusher
+            self._flusher = None
+            
+            # Saves queued while the flusher was winding down
+            pending = []
+            while not self._write_queue.empty():
+                item = self._write_queue.get_nowait()
+                if item is not _STOP:
+                    pending.append(item)
+            if pending:
+                await self._write_batch(pending)
+        
+        for conn in self._read_conns:
+            await conn.close()
+        self._read_conns = []
+        
+        if self._conn is not None:
+            await self._conn.close()
+            self._conn = None
+            self._initialized = False
+            logger.info("Closed SQLite connection")
@@ -0,0 +1,31 @@
+"""
+Shared test fixtures.
+"""
+import asyncio
+
+import pytest
+import pytest_asyncio
+
+from shared.database import FirestoreDatabase
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+
+@pytest.fixture(scope="session")
+def event_loop_policy():
+    """Run the tests on uvloop when it is installed, like the services."""
+    if uvloop is not None:
+        return uvloop.EventLoopPolicy()
+    return asyncio.DefaultEventLoopPolicy()
+
+
+@pytest_asyncio.fixture(scope="session")
+async def db():
+    """Emulator-backed database shared by the whole session, so the client pool is set up once."""
+    database = FirestoreDatabase(use_emulator=True)
+    await database.connect()
+    yield database
+    await database.close()
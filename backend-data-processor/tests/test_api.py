@@ -1,9 +1,24 @@
 """
 Unit tests for the API service.
 """
+import asyncio
+
 import pytest
-from httpx import AsyncClient
+import pytest_asyncio
+from httpx import ASGITransport, AsyncClient
+from api.config import get_settings
 from api.main import app
+from shared.publish_batcher import PublishBatcher
+
+# Share one event loop (and one client) across the module
+pytestmark = pytest.mark.asyncio(scope="module")
+
+
+@pytest_asyncio.fixture(scope="module")
+async def client():
+    """HTTP client bound to the app, created once per module."""
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as c:
+        yield c
 
 
 @pytest.fixture
@@ -22,188 +37,308 @@ def sample_text_payload():
     return "This is a test log entry with phone 555-0199"
 
 
-@pytest.mark.asyncio
-async def test_root_endpoint():
+@pytest.fixture
+def override_settings():
+    """Serve requests with some settings changed; call it with the fields to override."""
+    def override(**fields):
+        app.dependency_overrides[get_settings] = lambda: get_settings().model_copy(update=fields)
+    
+    yield override
+    app.dependency_overrides.pop(get_settings, None)
+
+
+async def test_root_endpoint(client):
     """Test root endpoint returns service info."""
-    async with AsyncClient(app=app, base_url="http://test") as client:
-        response = await client.get("/")
-        assert response.status_code == 200
-        data = response.json()
-        assert "service" in data
-        assert "version" in data
+    response = await client.get("/")
+    assert response.status_code == 200
+    data = response.json()
+    assert "service" in data
+    assert "version" in data
 
 
-@pytest.mark.asyncio
-async def test_health_check():
+async def test_health_check(client):
     """Test health check endpoint."""
-    async with AsyncClient(app=app, base_url="http://test") as client:
-        response = await client.get("/health")
-        assert response.status_code == 200
-        data = response.json()
-        assert data["status"] == "healthy"
+    response = await client.get("/health")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["status"] == "healthy"
 
 
-@pytest.mark.asyncio
-async def test_readiness_check():
+async def test_readiness_check(client):
     """Test readiness check endpoint."""
-    async with AsyncClient(app=app, base_url="http://test") as client:
-        response = await client.get("/readiness")
-        assert response.status_code == 200
-        data = response.json()
-        assert data["status"] == "ready"
+    response = await client.get("/readiness")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["status"] == "ready"
 
 
-@pytest.mark.asyncio
-async def test_ingest_json_success(sample_json_payload):
+async def test_ingest_json_success(client, sample_json_payload):
     """Test successful JSON ingestion."""
-    async with AsyncClient(app=app, base_url="http://test") as client:
-        response = await client.post(
-            "/ingest",
-            json=sample_json_payload,
-            headers={"Content-Type": "application/json"}
-        )
-        assert response.status_code == 202
-        data = response.json()
-        assert data["status"] == "accepted"
-        assert data["tenant_id"] == "acme_corp"
-        assert data["log_id"] == "test_123"
-        assert "request_id" in data
+    response = await client.post(
+        "/ingest",
+        json=sample_json_payload,
+        headers={"Content-Type": "application/json"}
+    )
+    assert response.status_code == 202
+    data = response.json()
+    assert data["status"] == "accepted"
+    assert data["tenant_id"] == "acme_corp"
+    assert data["log_id"] == "test_123"
+    assert "request_id" in data
 
 
-@pytest.mark.asyncio
-async def test_ingest_json_invalid_tenant():
+async def test_ingest_json_invalid_tenant(client):
     """Test JSON ingestion with invalid tenant ID."""
-    async with AsyncClient(app=app, base_url="http://test") as client:
-        response = await client.post(
-            "/ingest",
-            json={
-                "tenant_id": "invalid@tenant!",
-                "log_id": "test_123",
-                "text": "Test log"
-            },
-            headers={"Content-Type": "application/json"}
-        )
-        assert response.status_code == 400
+    response = await client.post(
+        "/ingest",
+        json={
+            "tenant_id": "invalid@tenant!",
+            "log_id": "test_123",
+            "text": "Test log"
+        },
+        headers={"Content-Type": "application/json"}
+    )
+    assert response.status_code == 400
 
 
-@pytest.mark.asyncio
-async def test_ingest_json_missing_fields():
+async def test_ingest_json_missing_fields(client):
     """Test JSON ingestion with missing required fields."""
-    async with AsyncClient(app=app, base_url="http://test") as client:
-        response = await client.post(
-            "/ingest",
-            json={
-                "tenant_id": "acme_corp",
-                "log_id": "test_123"
-                # Missing 'text' field
-            },
-            headers={"Content-Type": "application/json"}
-        )
-        assert response.status_code == 400
+    response = await client.post(
+        "/ingest",
+        json={
+            "tenant_id": "acme_corp",
+            "log_id": "test_123"
+            # Missing 'text' field
+        },
+        headers={"Content-Type": "application/json"}
+    )
+    assert response.status_code == 400
 
 
-@pytest.mark.asyncio
-async def test_ingest_text_success(sample_text_payload):
+async def test_ingest_text_success(client, sample_text_payload):
     """Test successful text ingestion."""
-    async with AsyncClient(app=app, base_url="http://test") as client:
-        response = await client.post(
-            "/ingest",
-            content=sample_text_payload,
-            headers={
-                "Content-Type": "text/plain",
-                "X-Tenant-ID": "beta_inc"
-            }
-        )
-        assert response.status_code == 202
-        data = response.json()
-        assert data["status"] == "accepted"
-        assert data["tenant_id"] == "beta_inc"
-        assert "log_id" in data
-        assert "request_id" in data
+    response = await client.post(
+        "/ingest",
+        content=sample_text_payload,
+        headers={
+            "Content-Type": "text/plain",
+            "X-Tenant-ID": "beta_inc"
+        }
+    )
+    assert response.status_code == 202
+    data = response.json()
+    assert data["status"] == "accepted"
+    assert data["tenant_id"] == "beta_inc"
+    assert "log_id" in data
+    assert "request_id" in data
 
 
-@pytest.mark.asyncio
-async def test_ingest_text_missing_tenant_header(sample_text_payload):
+async def test_ingest_text_missing_tenant_header(client, sample_text_payload):
     """Test text ingestion without X-Tenant-ID header."""
-    async with AsyncClient(app=app, base_url="http://test") as client:
-        response = await client.post(
-            "/ingest",
-            content=sample_text_payload,
-            headers={"Content-Type": "text/plain"}
-        )
-        assert response.status_code == 400
-        data = response.json()
-        assert "X-Tenant-ID" in data["message"]
+    response = await client.post(
+        "/ingest",
+        content=sample_text_payload,
+        headers={"Content-Type": "text/plain"}
+    )
+    assert response.status_code == 400
+    data = response.json()
+    assert "X-Tenant-ID" in data["message"]
 
 
-@pytest.mark.asyncio
-async def test_ingest_text_empty_payload():
+async def test_ingest_text_empty_payload(client):
     """Test text ingestion with empty payload."""
-    async with AsyncClient(app=app, base_url="http://test") as client:
-        response = await client.post(
-            "/ingest",
-            content="",
-            headers={
-                "Content-Type": "text/plain",
-                "X-Tenant-ID": "test_tenant"
-            }
-        )
-        assert response.status_code == 400
+    response = await client.post(
+        "/ingest",
+        content="",
+        headers={
+            "Content-Type": "text/plain",
+            "X-Tenant-ID": "test_tenant"
+        }
+    )
+    assert response.status_code == 400
 
 
-@pytest.mark.asyncio
-async def test_ingest_unsupported_content_type():
+async def test_ingest_unsupported_content_type(client):
     """Test ingestion with unsupported content type."""
-    async with AsyncClient(app=app, base_url="http://test") as client:
-        response = await client.post(
-            "/ingest",
-            content="test",
-            headers={"Content-Type": "application/xml"}
-        )
-        assert response.status_code == 400
-        data = response.json()
-        assert "Unsupported Content-Type" in data["message"]
+    response = await client.post(
+        "/ingest",
+        content="test",
+        headers={"Content-Type": "application/xml"}
+    )
+    assert response.status_code == 400
+    data = response.json()
+    assert "Unsupported Content-Type" in data["message"]
 
 
-@pytest.mark.asyncio
-async def test_tenant_id_normalization():
+async def test_tenant_id_normalization(client):
     """Test that tenant IDs are properly normalized."""
-    async with AsyncClient(app=app, base_url="http://test") as client:
-        response = await client.post(
+    response = await client.post(
+        "/ingest",
+        json={
+            "tenant_id": "Acme-Corp_123",
+            "log_id": "test",
+            "text": "Test"
+        },
+        headers={"Content-Type": "application/json"}
+    )
+    assert response.status_code == 202
+    data = response.json()
+    # Should be normalized to lowercase with safe characters
+    assert data["tenant_id"] == "acme-corp_123"
+
+
+async def test_settings_dependency_override(client, override_settings):
+    """Test that request handlers read settings through the overridable get_settings dependency."""
+    override_settings(app_name="Overridden API", max_request_size=16)
+    
+    response = await client.get("/")
+    assert response.json()["service"] == "Overridden API"
+    
+    response = await client.post(
+        "/ingest",
+        content=b"x" * 32,
+        headers={"Content-Type": "text/plain", "X-Tenant-ID": "acme"}
+    )
+    assert response.status_code == 413
+
+
+@pytest.mark.parametrize("content_type", ["application/json", "text/plain"])
+async def test_ingest_streamed_body_too_large(client, override_settings, content_type):
+    """Test that a chunked body without Content-Length is rejected once it passes the size limit."""
+    override_settings(max_request_size=1024)
+    
+    async def body():
+        for _ in range(64):
+            yield b"x" * 512
+    
+    response = await client.post(
+        "/ingest",
+        content=body(),
+        headers={"Content-Type": content_type, "X-Tenant-ID": "acme"}
+    )
+    assert "content-length" not in response.request.headers
+    assert response.status_code == 413
+
+
+async def test_concurrent_requests(client):
+    """Test handling multiple concurrent requests."""
+    tasks = []
+    for i in range(10):
+        task = client.post(
             "/ingest",
             json={
-                "tenant_id": "Acme-Corp_123",
-                "log_id": "test",
-                "text": "Test"
+                "tenant_id": f"tenant_{i}",
+                "log_id": f"log_{i}",
+                "text": f"Test log {i}"
             },
             headers={"Content-Type": "application/json"}
         )
+        tasks.append(task)
+    
+    responses = await asyncio.gather(*tasks)
+    
+    # All should succeed
+    for response in responses:
         assert response.status_code == 202
-        data = response.json()
-        # Should be normalized to lowercase with safe characters
-        assert data["tenant_id"] == "acme-corp_123"
 
 
-@pytest.mark.asyncio
-async def test_concurrent_requests():
-    """Test handling multiple concurrent requests."""
-    async with AsyncClient(app=app, base_url="http://test") as client:
-        tasks = []
-        for i in range(10):
-            task = client.post(
-                "/ingest",
-                json={
-                    "tenant_id": f"tenant_{i}",
-                    "log_id": f"log_{i}",
-                    "text": f"Test log {i}"
-                },
-                headers={"Content-Type": "application/json"}
-            )
-            tasks.append(task)
-        
-        import asyncio
-        responses = await asyncio.gather(*tasks)
-        
-        # All should succeed
-        for response in responses:
-            assert response.status_code == 202
\ No newline at end of file
+async def test_cors_headers(client):
+    """Test that CORS headers are added and preflight is answered."""
+    response = await client.get("/")
+    assert response.headers["access-control-allow-origin"] == "*"
+    
+    response = await client.options(
+        "/ingest",
+        headers={
+            "Origin": "http://example.com",
+            "Access-Control-Request-Method": "POST"
+        }
+    )
+    assert response.status_code == 200
+    assert "POST" in response.headers["access-control-allow-methods"]
+
+
+async def test_cors_credentials(client):
+    """Test that credentialed requests get their origin echoed back."""
+    response = await client.get("/", headers={"Origin": "http://example.com"})
+    assert response.headers["access-control-allow-origin"] == "*"
+    assert response.headers["access-control-allow-credentials"] == "true"
+    
+    response = await client.get(
+        "/", headers={"Origin": "http://example.com", "Cookie": "session=1"}
+    )
+    assert response.headers["access-control-allow-origin"] == "http://example.com"
+    assert response.headers["access-control-allow-credentials"] == "true"
+    assert response.headers["vary"] == "Origin"
+    
+    response = await client.options(
+        "/ingest",
+        headers={
+            "Origin": "http://example.com",
+            "Access-Control-Request-Method": "POST",
+            "Access-Control-Request-Headers": "X-Tenant-ID, Content-Type"
+        }
+    )
+    assert response.headers["access-control-allow-origin"] == "http://example.com"
+    assert response.headers["access-control-allow-credentials"] == "true"
+    assert response.headers["access-control-allow-headers"] == "X-Tenant-ID, Content-Type"
+
+
+class FakeQueue:
+    """Records published batches; the first fail_times publishes fail."""
+    
+    def __init__(self, fail_times: int = 0, delay: float = 0.0):
+        self.fail_times = fail_times
+        self.delay = delay
+        self.batches = []
+    
+    async def publish(self, message):
+        return await self.publish_many([message])
+    
+    async def publish_many(self, messages):
+        await asyncio.sleep(self.delay)
+        if self.fail_times:
+            self.fail_times -= 1
+            return False
+        self.batches.append(list(messages))
+        return True
+
+
+async def test_publish_batcher_drains_on_close():
+    """Test that close() publishes the in-flight batch and everything still buffered."""
+    queue = FakeQueue(delay=0.05)
+    batcher = PublishBatcher(queue, batch_size=2)
+    batcher.start()
+    
+    for i in range(5):
+        assert await batcher.publish({"log_id": str(i)})
+    await asyncio.sleep(0.01)  # First batch is now awaiting publish_many
+    await batcher.close()
+    
+    published = [message["log_id"] for batch in queue.batches for message in batch]
+    assert published == ["0", "1", "2", "3", "4"]
+    assert all(len(batch) <= 2 for batch in queue.batches)
+    
+    # After close, messages are published directly
+    assert await batcher.publish({"log_id": "5"})
+    assert queue.batches[-1] == [{"log_id": "5"}]
+
+
+async def test_publish_batcher_retries_failed_batch():
+    """Test that a failed publish is retried, and dropped only after max_attempts."""
+    queue = FakeQueue(fail_times=2)
+    batcher = PublishBatcher(queue, max_attempts=3, retry_delay_seconds=0.01)
+    batcher.start()
+    
+    assert await batcher.publish({"log_id": "retried"})
+    await batcher.close()
+    assert queue.batches == [[{"log_id": "retried"}]]
+    
+    queue = FakeQueue(fail_times=3)
+    batcher = PublishBatcher(queue, max_attempts=3, retry_delay_seconds=0.01)
+    batcher.start()
+    
+    assert await batcher.publish({"log_id": "dropped"})
+    await batcher.close()
+    assert queue.batches == []
+    assert queue.fail_times == 0
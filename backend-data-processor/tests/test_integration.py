@@ -3,16 +3,19 @@ Integration tests for end-to-end workflow.
 Tests API -> Queue -> Worker -> Database flow.
 """
 import pytest
+import pytest_asyncio
 import asyncio
+import base64
+import orjson
 from datetime import datetime
 
 from api.models import NormalizedMessage, ProcessedLog
 from api.utils import PIIRedactor
 from shared.message_queue import RedisMessageQueue
-from shared.database import FirestoreDatabase
+from shared.sqlite_database import SQLiteDatabase, _ZDICT_MIN_SAMPLES
 
 
-@pytest.mark.asyncio
+@pytest.mark.asyncio(scope="session")
 async def test_message_queue_publish_subscribe():
     """Test message queue publish and subscribe."""
     queue = RedisMessageQueue(queue_name="test-queue")
@@ -53,11 +56,9 @@ async def test_message_queue_publish_subscribe():
     assert received_messages[0]["tenant_id"] == "test_tenant"
 
 
-@pytest.mark.asyncio
-async def test_database_save_and_retrieve():
+@pytest.mark.asyncio(scope="session")
+async def test_database_save_and_retrieve(db):
     """Test database save and retrieve operations."""
-    db = FirestoreDatabase(use_emulator=True)
-    
     tenant_id = "test_tenant"
     log_id = "log_123"
     
@@ -84,11 +85,9 @@ async def test_database_save_and_retrieve():
     assert retrieved["original_text"] == "Test log entry"
 
 
-@pytest.mark.asyncio
-async def test_multi_tenant_isolation():
+@pytest.mark.asyncio(scope="session")
+async def test_multi_tenant_isolation(db):
     """Test that tenant data is properly isolated."""
-    db = FirestoreDatabase(use_emulator=True)
-    
     # Save logs for different tenants
     tenant_a_data = {
         "log_id": "log_a",
@@ -114,21 +113,27 @@ async def test_multi_tenant_isolation():
         "request_id": "req_b"
     }
     
-    await db.save_processed_log("tenant_a", "log_a", tenant_a_data)
-    await db.save_processed_log("tenant_b", "log_b", tenant_b_data)
+    # The saves are independent, so issue them concurrently
+    await asyncio.gather(
+        db.save_processed_log("tenant_a", "log_a", tenant_a_data),
+        db.save_processed_log("tenant_b", "log_b", tenant_b_data)
+    )
+    
+    tenant_a_logs, tenant_b_logs, cross_tenant_log = await asyncio.gather(
+        db.list_tenant_logs("tenant_a"),
+        db.list_tenant_logs("tenant_b"),
+        db.get_processed_log("tenant_a", "log_b")
+    )
     
     # Verify tenant A can only see their data
-    tenant_a_logs = await db.list_tenant_logs("tenant_a")
     assert len(tenant_a_logs) > 0
     assert all(log["original_text"] == "Tenant A data" for log in tenant_a_logs if log["log_id"] == "log_a")
     
     # Verify tenant B can only see their data
-    tenant_b_logs = await db.list_tenant_logs("tenant_b")
     assert len(tenant_b_logs) > 0
     assert all(log["original_text"] == "Tenant B data" for log in tenant_b_logs if log["log_id"] == "log_b")
     
     # Verify tenant A cannot retrieve tenant B's log
-    cross_tenant_log = await db.get_processed_log("tenant_a", "log_b")
     assert cross_tenant_log is None
 
 
@@ -161,7 +166,38 @@ def test_pii_redaction():
     assert count == 0
 
 
-@pytest.mark.asyncio
+@pytest.mark.parametrize("engine", ["re", "hyperscan"])
+def test_pii_redaction_batch(monkeypatch, engine):
+    """Test that batch redaction matches the combined regex run on each text on its own."""
+    # Force the joined single-scan path of the chosen engine
+    monkeypatch.setattr(PIIRedactor, "_NATIVE", None)
+    if engine == "re":
+        monkeypatch.setattr(PIIRedactor, "_HS_DB", None)
+    elif PIIRedactor._HS_DB is None:
+        pytest.skip("hyperscan is not installed")
+    
+    texts = [
+        "Call me at 555-123-4567",
+        "Card 1234 5678",
+        "9012 3456 continues in the next text",
+        "Contact: email@test.com from 10.0.0.1, café 192.168.1.1",
+        "",
+        "No PII here",
+        # Overlapping matches, where the pattern order of the regex decides
+        "555-123-4567.a@b.co",
+        # Non-ASCII digits, which only the regex reads as \d
+        "Phone ٥٥٥-١٢٣-٤٥٦٧"
+    ]
+    results = PIIRedactor.redact_many(texts)
+    
+    tokens = PIIRedactor._TOKENS
+    assert results == [
+        PIIRedactor._COMBINED.subn(lambda match: tokens[match.lastgroup], text) for text in texts
+    ]
+    assert [count for _, count in results] == [1, 0, 0, 3, 0, 0, 2, 1]
+
+
+@pytest.mark.asyncio(scope="session")
 async def test_end_to_end_workflow():
     """Test complete workflow: ingest -> queue -> process -> store."""
     # This would require all services running
@@ -200,11 +236,9 @@ async def test_end_to_end_workflow():
     assert processed.character_count > 0
 
 
-@pytest.mark.asyncio
-async def test_idempotency():
+@pytest.mark.asyncio(scope="session")
+async def test_idempotency(db):
     """Test that duplicate messages are handled idempotently."""
-    db = FirestoreDatabase(use_emulator=True)
-    
     tenant_id = "idempotent_tenant"
     log_id = "idempotent_log"
     
@@ -230,4 +264,570 @@ async def test_idempotency():
     
     # Retrieve and verify it was updated (last write wins)
     retrieved = await db.get_processed_log(tenant_id, log_id)
-    assert retrieved["original_text"] == "Second version"
\ No newline at end of file
+    assert retrieved["original_text"] == "Second version"
+
+
+def _processed_log(tenant_id: str, log_id: str, text: str = "Test log entry") -> dict:
+    """Processed log document as the worker writes it."""
+    return {
+        "log_id": log_id,
+        "tenant_id": tenant_id,
+        "source": "json_upload",
+        "original_text": text,
+        "modified_data": text,
+        "ingested_at": datetime.utcnow().isoformat(),
+        "processed_at": datetime.utcnow().isoformat(),
+        "processing_time_seconds": 0.1,
+        "character_count": len(text),
+        "request_id": f"req_{log_id}"
+    }
+
+
+@pytest.mark.asyncio
+async def test_sqlite_codec_dictionary_round_trip(tmp_path):
+    """Test that the trained compression dictionary lives in the database and survives reopening."""
+    db_path = str(tmp_path / "logs.db")
+    entries = [
+        ("codec_tenant", f"log_{i}", _processed_log("codec_tenant", f"log_{i}", f"User {i} logged in"))
+        for i in range(_ZDICT_MIN_SAMPLES + 200)
+    ]
+    
+    # Opened while there is too little data to train on, like a second
+    # worker process started early
+    early = SQLiteDatabase(db_path=db_path)
+    await early.connect()
+    
+    db = SQLiteDatabase(db_path=db_path)
+    await db.connect()
+    assert all(await db.save_processed_logs_many(entries))
+    await db.close()
+    
+    # Reopening trains a dictionary from the stored rows
+    db = SQLiteDatabase(db_path=db_path)
+    await db.connect()
+    assert db._codec.has_dictionary
+    assert await db.save_processed_log("codec_tenant", "dict_log", _processed_log("codec_tenant", "dict_log"))
+    await db.close()
+    
+    # The earlier connection picks the new dictionary up from the table
+    assert not early._codec.has_dictionary
+    assert (await early.get_processed_log("codec_tenant", "dict_log"))["log_id"] == "dict_log"
+    logs, _ = await early.list_tenant_logs_page("codec_tenant", limit=5)
+    assert len(logs) == 5
+    await early.close()
+    
+    # Rows from before and after training decode after another reopen
+    db = SQLiteDatabase(db_path=db_path)
+    await db.connect()
+    assert (await db.get_processed_log("codec_tenant", "log_7"))["original_text"] == "User 7 logged in"
+    assert (await db.get_processed_log("codec_tenant", "dict_log"))["request_id"] == "req_dict_log"
+    await db.close()
+
+
+@pytest.mark.asyncio
+async def test_sharded_queue_routes_by_tenant_and_drains_legacy_list():
+    """Test that tenants map to stable shards and the unsharded list is still consumed."""
+    queue = RedisMessageQueue(queue_name="test-sharded-queue", shard_count=4)
+    await queue.connect()
+    await queue._client.delete(queue.queue_name, *queue.shard_keys)
+    
+    messages = [{"tenant_id": f"tenant_{i % 3}", "log_id": f"log_{i}"} for i in range(9)]
+    assert await queue.publish_many(messages)
+    for tenant in ("tenant_0", "tenant_1", "tenant_2"):
+        assert queue._shard_key({"tenant_id": tenant}) in queue.shard_keys
+        assert len({queue._shard_key({"tenant_id": tenant}) for _ in range(3)}) == 1
+    
+    # Queued by a publisher from before sharding was enabled
+    await queue._client.rpush(queue.queue_name, b'{"tenant_id": "legacy", "log_id": "old"}')
+    
+    received = []
+    
+    async def callback(message):
+        received.append(message["log_id"])
+    
+    try:
+        await asyncio.wait_for(queue.subscribe(callback, block_timeout=1), timeout=1.5)
+    except asyncio.TimeoutError:
+        pass
+    await queue.close()
+    
+    assert sorted(received) == sorted([m["log_id"] for m in messages] + ["old"])
+
+
+@pytest.mark.asyncio
+async def test_worker_saves_each_redis_batch_together(tmp_path, monkeypatch):
+    """Test that the worker saves everything popped in one round with one save_processed_logs_many call."""
+    from worker import processor as worker_processor
+    
+    db = SQLiteDatabase(db_path=str(tmp_path / "logs.db"))
+    await db.connect()
+    monkeypatch.setattr(worker_processor, "database", db)
+    queue = RedisMessageQueue(queue_name="test-batch-save-queue")
+    await queue.connect()
+    await queue._client.delete(queue.queue_name)
+    
+    batch_sizes = []
+    save_many = db.save_processed_logs_many
+    
+    async def recording_save_many(entries):
+        batch_sizes.append(len(entries))
+        return await save_many(entries)
+    
+    monkeypatch.setattr(db, "save_processed_logs_many", recording_save_many)
+    
+    messages = [
+        {"tenant_id": "batch_tenant", "log_id": f"log_{i}", "text": f"Mail user{i}@example.com",
+         "source": "json", "request_id": f"req_{i}"}
+        for i in range(10)
+    ]
+    processor = worker_processor.LogProcessor()
+    try:
+        assert await queue.publish_many(messages)
+        try:
+            await asyncio.wait_for(
+                queue.subscribe(processor.process_messages, decode=False, batch=True, block_timeout=1),
+                timeout=1.5
+            )
+        except asyncio.TimeoutError:
+            pass
+        
+        assert batch_sizes == [10]
+        saved = await db.get_processed_log("batch_tenant", "log_3")
+        assert saved["modified_data"] == "Mail [EMAIL_REDACTED]"
+        assert processor.get_stats()["successful"] == 10
+    finally:
+        await queue.close()
+        await db.close()
+
+
+@pytest.mark.asyncio
+async def test_failed_messages_are_dead_lettered():
+    """Test that messages whose handler raises end up on the dead-letter list with their error."""
+    queue = RedisMessageQueue(queue_name="test-dlq-queue")
+    await queue.connect()
+    dlq_key = queue.dead_letter_queue
+    await queue._client.delete(queue.queue_name, dlq_key)
+    
+    handled = []
+    
+    async def callback(message):
+        if message["log_id"] == "poison":
+            raise ValueError("cannot process poison")
+        handled.append(message["log_id"])
+    
+    try:
+        assert await queue.publish_many([
+            {"tenant_id": "dlq_tenant", "log_id": "good_1"},
+            {"tenant_id": "dlq_tenant", "log_id": "poison"},
+            {"tenant_id": "dlq_tenant", "log_id": "good_2"},
+        ])
+        try:
+            await asyncio.wait_for(queue.subscribe(callback, block_timeout=1), timeout=1.5)
+        except asyncio.TimeoutError:
+            pass
+        
+        assert sorted(handled) == ["good_1", "good_2"]
+        dead_letters = [orjson.loads(entry) for entry in await queue._client.lrange(dlq_key, 0, -1)]
+        assert len(dead_letters) == 1
+        assert orjson.loads(dead_letters[0]["message"])["log_id"] == "poison"
+        assert dead_letters[0]["error"] == "cannot process poison"
+        assert await queue._client.llen(queue.queue_name) == 0
+    finally:
+        await queue._client.delete(dlq_key)
+        await queue.close()
+
+
+class _RecordingQueue:
+    """Stands in for the dead-letter topic and keeps what was published."""
+    
+    def __init__(self):
+        self.published = []
+    
+    async def publish_many(self, messages):
+        self.published.extend(messages)
+        return True
+
+
+def _push_envelope(message: dict) -> dict:
+    """Pub/Sub push request body carrying one message."""
+    return {
+        "message": {"data": base64.b64encode(orjson.dumps(message)).decode(), "messageId": "msg-1"},
+        "subscription": "projects/test/subscriptions/logs"
+    }
+
+
+@pytest_asyncio.fixture
+async def cloud_worker(tmp_path, monkeypatch):
+    """Cloud worker module with a short ack deadline, a SQLite database and a recording dead-letter topic."""
+    from worker import cloud_worker as worker_module
+    from worker import processor as worker_processor
+    
+    db = SQLiteDatabase(db_path=str(tmp_path / "logs.db"))
+    await db.connect()
+    monkeypatch.setattr(worker_processor, "database", db)
+    monkeypatch.setattr(worker_module, "database", db)
+    monkeypatch.setattr(worker_module.settings, "ack_deadline_seconds",
+                        worker_module.ACK_DEADLINE_MARGIN_SECONDS + 0.3)
+    monkeypatch.setattr(worker_module, "dead_letter_queue", _RecordingQueue())
+    monkeypatch.setattr(worker_module, "semaphore", asyncio.Semaphore(1))
+    yield worker_module
+    await db.close()
+
+
+async def _push(worker_module, message: dict) -> int:
+    """POST a push delivery to the cloud worker and return the status code."""
+    from httpx import ASGITransport, AsyncClient
+    
+    async with AsyncClient(transport=ASGITransport(app=worker_module.app), base_url="http://test") as client:
+        response = await client.post("/", json=_push_envelope(message))
+    return response.status_code
+
+
+_PUSHED = {"tenant_id": "push_tenant", "log_id": "push_1", "text": "hello", "source": "json", "request_id": "req_push"}
+
+
+@pytest.mark.asyncio
+async def test_push_deadline_includes_semaphore_wait(cloud_worker):
+    """Test that a push stuck waiting for a processing slot is dead-lettered within its deadline."""
+    await cloud_worker.semaphore.acquire()
+    try:
+        assert await _push(cloud_worker, _PUSHED) == 200
+    finally:
+        cloud_worker.semaphore.release()
+    
+    assert [orjson.loads(data)["log_id"] for data in cloud_worker.dead_letter_queue.published] == ["push_1"]
+
+
+@pytest.mark.asyncio
+async def test_push_deadline_dead_letters_before_save(cloud_worker, monkeypatch):
+    """Test that a push whose redaction overruns the deadline is dead-lettered and never saved."""
+    class SlowRedactor(PIIRedactor):
+        async def redact_many_async(self, texts, enable=True):
+            await asyncio.sleep(1)
+            return [(text, 0) for text in texts]
+    
+    monkeypatch.setattr(cloud_worker.processor, "pii_redactor", SlowRedactor())
+    
+    assert await _push(cloud_worker, _PUSHED) == 200
+    assert len(cloud_worker.dead_letter_queue.published) == 1
+    assert await cloud_worker.database.get_processed_log("push_tenant", "push_1") is None
+
+
+@pytest.mark.asyncio
+async def test_push_deadline_does_not_cancel_save(cloud_worker, monkeypatch):
+    """Test that a save still running at the deadline completes and the push is acked, not dead-lettered."""
+    db = cloud_worker.database
+    save_many = db.save_processed_logs_many
+    
+    async def slow_save_many(entries):
+        await asyncio.sleep(0.5)
+        return await save_many(entries)
+    
+    monkeypatch.setattr(db, "save_processed_logs_many", slow_save_many)
+    
+    assert await _push(cloud_worker, _PUSHED) == 200
+    assert cloud_worker.dead_letter_queue.published == []
+    assert (await db.get_processed_log("push_tenant", "push_1"))["modified_data"] == "hello"
+
+
+@pytest.mark.asyncio
+async def test_pull_loop_acks_saved_messages_and_nacks_failures(cloud_worker, monkeypatch):
+    """Test that the pull loop acks only the messages that were saved and nacks the rest."""
+    from types import SimpleNamespace
+    from google.cloud import pubsub_v1
+    
+    class FakeSubscriber:
+        def __init__(self):
+            self.acked = []
+            self.nacked = []
+            self.pulls = 0
+        
+        def subscription_path(self, project, subscription):
+            return f"projects/{project}/subscriptions/{subscription}"
+        
+        def pull(self, request, timeout):
+            self.pulls += 1
+            # Payloads may be the very same bytes object (b'' always is),
+            # so outcomes must be matched by position
+            good = orjson.dumps(_PUSHED)
+            payloads = [good, orjson.dumps({"tenant_id": "push_tenant"}), b"", good] if self.pulls == 1 else []
+            return SimpleNamespace(received_messages=[
+                SimpleNamespace(ack_id=f"ack_{i}", message=SimpleNamespace(data=data))
+                for i, data in enumerate(payloads)
+            ])
+        
+        def acknowledge(self, request):
+            self.acked.extend(request["ack_ids"])
+        
+        def modify_ack_deadline(self, request):
+            assert request["ack_deadline_seconds"] == 0
+            self.nacked.extend(request["ack_ids"])
+        
+        def close(self):
+            pass
+    
+    subscriber = FakeSubscriber()
+    monkeypatch.setattr(pubsub_v1, "SubscriberClient", lambda: subscriber)
+    
+    task = asyncio.create_task(cloud_worker.pull_loop())
+    for _ in range(100):
+        if subscriber.pulls > 1:
+            break
+        await asyncio.sleep(0.01)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    
+    assert subscriber.acked == ["ack_0", "ack_3"]
+    assert subscriber.nacked == ["ack_1", "ack_2"]
+    assert await cloud_worker.database.get_processed_log("push_tenant", "push_1") is not None
+
+
+@pytest.mark.asyncio
+async def test_cloud_worker_health_bodies():
+    """Test that the worker's health routes return the same JSON bodies as before."""
+    from httpx import ASGITransport, AsyncClient
+    from worker.cloud_worker import app as worker_app
+    
+    async with AsyncClient(transport=ASGITransport(app=worker_app), base_url="http://test") as client:
+        root = await client.get("/")
+        health = await client.get("/health")
+    
+    assert root.status_code == 200
+    assert root.headers["content-type"] == "application/json"
+    assert root.json() == {"status": "healthy", "service": "log-processor-worker"}
+    assert health.json() == {"status": "healthy"}
+
+
+@pytest.mark.asyncio
+async def test_sqlite_migrates_old_schema(tmp_path):
+    """Test that a table from before the columnar layout is migrated and its rows stay readable."""
+    import sqlite3
+    
+    db_path = str(tmp_path / "logs.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute("""
+        CREATE TABLE processed_logs (
+            tenant_id TEXT NOT NULL,
+            log_id TEXT NOT NULL,
+            data TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (tenant_id, log_id)
+        )
+    """)
+    # Old rows hold plain JSON text; the last one names another tenant
+    rows = [
+        ("old_tenant", "old_1", "old_tenant", "2024-01-01 00:00:00"),
+        ("old_tenant", "old_2", "old_tenant", "2024-01-02 00:00:00"),
+        ("old_tenant", "leaked", "intruder", "2024-01-03 00:00:00"),
+    ]
+    conn.executemany(
+        "INSERT INTO processed_logs (tenant_id, log_id, data, updated_at) VALUES (?, ?, ?, ?)",
+        [
+            (tenant_id, log_id, orjson.dumps(_processed_log(payload_tenant_id, log_id)).decode(), updated_at)
+            for tenant_id, log_id, payload_tenant_id, updated_at in rows
+        ]
+    )
+    conn.commit()
+    conn.close()
+    
+    db = SQLiteDatabase(db_path=db_path)
+    await db.connect()
+    
+    metadata = await db.list_tenant_logs_metadata("old_tenant")
+    assert [entry["log_id"] for entry in metadata] == ["leaked", "old_2", "old_1"]
+    assert metadata[-1]["ts"] == 1704067200000
+    assert (await db.get_processed_log("old_tenant", "old_1"))["original_text"] == "Test log entry"
+    
+    isolation = await db.verify_tenant_isolation("old_tenant")
+    assert isolation["total_logs"] == 3
+    assert isolation["cross_tenant_leak_count"] == 1
+    
+    # New writes land next to the migrated rows
+    assert await db.save_processed_log("old_tenant", "new_1", _processed_log("old_tenant", "new_1"))
+    assert (await db.list_tenant_logs_metadata("old_tenant", limit=1))[0]["log_id"] == "new_1"
+    await db.close()
+
+
+@pytest.mark.asyncio
+async def test_sqlite_tenant_stats_triggers(tmp_path):
+    """Test that tenant_stats follows inserts and deletes and ignores rewrites of existing logs."""
+    db = SQLiteDatabase(db_path=str(tmp_path / "logs.db"))
+    await db.connect()
+    
+    entries = [("stats_a", f"log_{i}", _processed_log("stats_a", f"log_{i}")) for i in range(3)]
+    entries += [("stats_b", f"log_{i}", _processed_log("stats_b", f"log_{i}")) for i in range(2)]
+    assert all(await db.save_processed_logs_many(entries))
+    
+    # Rewriting a log is an upsert and must not be counted again
+    assert await db.save_processed_log("stats_a", "log_0", _processed_log("stats_a", "log_0", "Rewritten"))
+    assert await db.get_stats() == {"total_logs": 5, "total_tenants": 2, "database_path": db.db_path}
+    assert (await db.verify_tenant_isolation("stats_a"))["total_logs"] == 3
+    
+    await db._conn.execute("DELETE FROM processed_logs WHERE tenant_id = 'stats_b'")
+    stats = await db.get_stats()
+    assert (stats["total_logs"], stats["total_tenants"]) == (3, 1)
+    assert await db.get_all_tenants() == ["stats_a"]
+    await db.close()
+
+@pytest.mark.asyncio
+async def test_sqlite_in_memory_database():
+    """Test that ":memory:" still works, reading through the writer connection."""
+    db = SQLiteDatabase(db_path=":memory:")
+    await db.connect()
+    
+    assert await db.save_processed_log("memory_tenant", "log_1", _processed_log("memory_tenant", "log_1"))
+    assert (await db.get_processed_log("memory_tenant", "log_1"))["log_id"] == "log_1"
+    assert len(await db.list_tenant_logs("memory_tenant")) == 1
+    assert (await db.get_stats())["total_logs"] == 1
+    await db.close()
+
+
+@pytest.mark.asyncio
+async def test_batch_subscriber_dead_letters_by_position():
+    """Test that a batch callback's failures are matched to messages by position, not identity."""
+    queue = RedisMessageQueue(queue_name="test-batch-dlq-queue")
+    await queue.connect()
+    dlq_key = queue.dead_letter_queue
+    await queue._client.delete(queue.queue_name, dlq_key)
+    
+    async def callback(messages):
+        # Rebuilt objects, as a callback that normalizes its input would return
+        return [(position, ValueError(f"bad {message['log_id']}"))
+                for position, message in enumerate(dict(m) for m in messages)
+                if message["log_id"].startswith("bad")]
+    
+    try:
+        assert await queue.publish_many([
+            {"tenant_id": "batch_dlq", "log_id": "ok_1"},
+            {"tenant_id": "batch_dlq", "log_id": "bad_1"},
+            {"tenant_id": "batch_dlq", "log_id": "ok_2"},
+        ])
+        try:
+            await asyncio.wait_for(queue.subscribe(callback, batch=True, block_timeout=1), timeout=1.5)
+        except asyncio.TimeoutError:
+            pass
+        
+        dead_letters = [orjson.loads(entry) for entry in await queue._client.lrange(dlq_key, 0, -1)]
+        assert [orjson.loads(entry["message"])["log_id"] for entry in dead_letters] == ["bad_1"]
+        assert dead_letters[0]["error"] == "bad bad_1"
+    finally:
+        await queue._client.delete(dlq_key)
+        await queue.close()
+
+
+@pytest.mark.asyncio
+async def test_sqlite_group_commit_and_close_with_pending_saves(tmp_path, monkeypatch):
+    """Test that concurrent saves share transactions and close() commits saves still queued."""
+    db_path = str(tmp_path / "logs.db")
+    db = SQLiteDatabase(db_path=db_path, write_batch_size=16)
+    await db.connect()
+    
+    batch_sizes = []
+    write_batch = db._write_batch
+    
+    async def recording_write_batch(batch):
+        batch_sizes.append(len(batch))
+        await write_batch(batch)
+    
+    monkeypatch.setattr(db, "_write_batch", recording_write_batch)
+    
+    results = await asyncio.gather(*(
+        db.save_processed_log("group_tenant", f"log_{i}", _processed_log("group_tenant", f"log_{i}"))
+        for i in range(40)
+    ))
+    assert all(results)
+    assert sum(batch_sizes) == 40
+    assert max(batch_sizes) == 16
+    
+    # Saves still queued when close() is called are committed, not dropped
+    pending = [
+        asyncio.create_task(
+            db.save_processed_log("group_tenant", f"late_{i}", _processed_log("group_tenant", f"late_{i}"))
+        )
+        for i in range(10)
+    ]
+    await asyncio.sleep(0)
+    await db.close()
+    assert all(await asyncio.gather(*pending))
+    
+    db = SQLiteDatabase(db_path=db_path)
+    await db.connect()
+    assert (await db.get_stats())["total_logs"] == 50
+    assert await db.get_processed_log("group_tenant", "late_9") is not None
+    await db.close()
+
+
+@pytest.mark.asyncio
+async def test_sqlite_keyset_pagination(tmp_path):
+    """Test that page tokens walk every log once, newest first, and stop after the last page."""
+    db = SQLiteDatabase(db_path=str(tmp_path / "logs.db"))
+    await db.connect()
+    
+    # Separate calls so the logs get distinct timestamps as well as log_id ties
+    for i in range(25):
+        log_id = f"log_{i:02d}"
+        assert await db.save_processed_log("page_tenant", log_id, _processed_log("page_tenant", log_id))
+        if i % 5 == 4:
+            await asyncio.sleep(0.002)
+    assert await db.save_processed_log("other_tenant", "log_99", _processed_log("other_tenant", "log_99"))
+    
+    pages = []
+    page_token = None
+    while True:
+        logs, page_token = await db.list_tenant_logs_page("page_tenant", limit=10, page_token=page_token)
+        pages.append([log["log_id"] for log in logs])
+        if page_token is None:
+            break
+    await db.close()
+    
+    assert [len(page) for page in pages] == [10, 10, 5]
+    seen = [log_id for page in pages for log_id in page]
+    assert sorted(seen) == [f"log_{i:02d}" for i in range(25)]
+    assert seen[0] == "log_24"
+
+
+@pytest.mark.asyncio
+async def test_sqlite_isolation_counts_leaks_in_sql(tmp_path):
+    """Test that rows whose payload names another tenant, or none, are counted and returned as leaks."""
+    db = SQLiteDatabase(db_path=str(tmp_path / "logs.db"))
+    await db.connect()
+    
+    no_tenant = _processed_log("iso_a", "no_tenant")
+    del no_tenant["tenant_id"]
+    assert all(await db.save_processed_logs_many(
+        [("iso_a", f"log_{i}", _processed_log("iso_a", f"log_{i}")) for i in range(4)]
+        + [("iso_a", f"leak_{i}", _processed_log("iso_b", f"leak_{i}")) for i in range(3)]
+        + [("iso_a", "no_tenant", no_tenant), ("iso_b", "log_0", _processed_log("iso_b", "log_0"))]
+    ))
+    
+    result = await db.verify_tenant_isolation("iso_a", max_leaks=2)
+    assert result["total_logs"] == 8
+    assert result["isolation_violated"]
+    assert result["cross_tenant_leak_count"] == 4
+    assert len(result["cross_tenant_leaks"]) == 2
+    assert all(leak.get("tenant_id") != "iso_a" for leak in result["cross_tenant_leaks"])
+    
+    clean = await db.verify_tenant_isolation("iso_b")
+    assert (clean["total_logs"], clean["cross_tenant_leak_count"]) == (1, 0)
+    assert not clean["isolation_violated"]
+    await db.close()
+
+
+@pytest.mark.asyncio
+async def test_push_ack_early_queues_and_backs_off(cloud_worker, monkeypatch):
+    """Test that early-acked pushes are processed in the background and a full queue answers 503."""
+    queue = asyncio.Queue(maxsize=1)
+    monkeypatch.setattr(cloud_worker, "push_queue", queue)
+    
+    assert await _push(cloud_worker, _PUSHED) == 200
+    assert await _push(cloud_worker, {**_PUSHED, "log_id": "push_2"}) == 503
+    
+    consumer = asyncio.create_task(cloud_worker.push_consumer(queue))
+    await asyncio.wait_for(queue.join(), timeout=5)
+    consumer.cancel()
+    await asyncio.gather(consumer, return_exceptions=True)
+    
+    assert await cloud_worker.database.get_processed_log("push_tenant", "push_1") is not None
+    assert await cloud_worker.database.get_processed_log("push_tenant", "push_2") is None
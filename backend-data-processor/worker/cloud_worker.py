@@ -3,13 +3,18 @@ Cloud Run worker entry point.
 Receives Pub/Sub push messages via HTTP.
 """
 import asyncio
-import base64
-import json
 import logging
+from contextlib import asynccontextmanager
+from typing import Optional
 from fastapi import FastAPI, Request, Response
+from starlette.routing import Route
+import msgspec
 import uvicorn
 
-from worker.processor import LogProcessor
+from api.utils import run_off_loop_if_large
+from worker.config import settings
+from worker.processor import LogProcessor, database
+from shared.message_queue import PubSubMessageQueue
 
 # Configure logging
 logging.basicConfig(
@@ -18,23 +23,186 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Initialize FastAPI app
-app = FastAPI(title="Log Processor Worker")
+
+class PushMessage(msgspec.Struct):
+    """The message part of a Pub/Sub push envelope."""
+    data: Optional[bytes] = None  # base64 in the JSON, decoded by msgspec
+    messageId: str = ""
+
+
+class PushEnvelope(msgspec.Struct):
+    """Pub/Sub push request body; fields not listed here are skipped."""
+    message: Optional[PushMessage] = None
+
+
+_ENVELOPE_DECODER = msgspec.json.Decoder(PushEnvelope)
 
 # Initialize processor
 processor = LogProcessor()
 
+# Bounds how many push deliveries are processed at once
+semaphore = asyncio.Semaphore(settings.max_concurrent_messages)
+
+# Pushed messages waiting for a consumer when push_ack_early is set
+push_queue: Optional[asyncio.Queue] = None
+
+# Leave time to dead-letter and respond before Pub/Sub gives up on the push
+ACK_DEADLINE_MARGIN_SECONDS = 5.0
+
+dead_letter_queue = (
+    PubSubMessageQueue(project_id=settings.gcp_project_id, topic_name=settings.pubsub_dlq_topic)
+    if settings.pubsub_dlq_topic else None
+)
+
+
+async def push_consumer(queue: asyncio.Queue) -> None:
+    """Process messages acked early by the push handler until cancelled."""
+    while True:
+        message_data = await queue.get()
+        try:
+            await processor.process_message(message_data)
+        except Exception as e:
+            logger.error(f"Error processing queued Pub/Sub message: {e}", exc_info=True)
+        finally:
+            queue.task_done()
 
-@app.get("/")
-async def root():
+
+async def pull_loop() -> None:
+    """Pull message batches from the subscription and process them until cancelled."""
+    from google.cloud import pubsub_v1
+    
+    subscriber = pubsub_v1.SubscriberClient()
+    subscription = subscriber.subscription_path(settings.gcp_project_id, settings.pubsub_subscription)
+    logger.info(f"Pulling messages from {subscription}")
+    
+    try:
+        while True:
+            try:
+                response = await asyncio.to_thread(
+                    subscriber.pull,
+                    request={
+                        "subscription": subscription,
+                        "max_messages": settings.pubsub_pull_max_messages
+                    },
+                    timeout=30
+                )
+                received = response.received_messages
+                if not received:
+                    continue
+                
+                # The whole batch is processed concurrently; what was saved
+                # is acked at once and the rest nacked for redelivery
+                failures = await processor.process_messages([m.message.data for m in received])
+                failed = {position for position, _ in failures}
+                ack_ids = [m.ack_id for position, m in enumerate(received) if position not in failed]
+                nack_ids = [m.ack_id for position, m in enumerate(received) if position in failed]
+                
+                if ack_ids:
+                    await asyncio.to_thread(
+                        subscriber.acknowledge,
+                        request={"subscription": subscription, "ack_ids": ack_ids}
+                    )
+                if nack_ids:
+                    logger.warning(f"Nacking {len(nack_ids)} of {len(received)} pulled messages")
+                    await asyncio.to_thread(
+                        subscriber.modify_ack_deadline,
+                        request={"subscription": subscription, "ack_ids": nack_ids, "ack_deadline_seconds": 0}
+                    )
+            
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error in pull loop: {e}")
+                await asyncio.sleep(1)  # Back off on error
+    finally:
+        subscriber.close()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Connect the database, start the optional pull loop, and clean up on shutdown."""
+    # Open the client pool now so the first delivery doesn't pay for it
+    try:
+        await database.connect()
+    except Exception as e:
+        logger.warning(f"Database warmup failed, will retry on first message: {e}")
+    
+    global push_queue
+    consumers = []
+    if settings.push_ack_early:
+        push_queue = asyncio.Queue(maxsize=settings.push_queue_size)
+        consumers = [
+            asyncio.create_task(push_consumer(push_queue))
+            for _ in range(settings.max_concurrent_messages)
+        ]
+    
+    pull_task: Optional[asyncio.Task] = None
+    if settings.pubsub_pull_enabled:
+        pull_task = asyncio.create_task(pull_loop())
+    
+    yield
+    
+    # Finish messages that were already acked before stopping the consumers
+    if push_queue is not None:
+        queue, push_queue = push_queue, None
+        await queue.join()
+        for consumer in consumers:
+            consumer.cancel()
+        await asyncio.gather(*consumers, return_exceptions=True)
+    
+    if pull_task is not None:
+        pull_task.cancel()
+        try:
+            await pull_task
+        except asyncio.CancelledError:
+            pass
+    
+    if dead_letter_queue is not None:
+        await dead_letter_queue.close()
+    await database.close()
+
+
+# Initialize FastAPI app
+app = FastAPI(title="Log Processor Worker", lifespan=lifespan)
+
+
+# Health bodies never change, so they are encoded once
+_ROOT_BODY = msgspec.json.encode({"status": "healthy", "service": "log-processor-worker"})
+_HEALTH_BODY = msgspec.json.encode({"status": "healthy"})
+
+
+async def root(request: Request) -> Response:
     """Health check endpoint."""
-    return {"status": "healthy", "service": "log-processor-worker"}
+    return Response(_ROOT_BODY, media_type="application/json")
 
 
-@app.get("/health")
-async def health():
+async def health(request: Request) -> Response:
     """Health check for Cloud Run."""
-    return {"status": "healthy"}
+    return Response(_HEALTH_BODY, media_type="application/json")
+
+
+# Probes hit these many times a minute, so they are plain Starlette routes
+# ahead of the FastAPI ones: no dependency resolution or per-request JSON
+# encoding. GET only, so POST / still reaches the push handler
+app.router.routes[:0] = [
+    Route("/", root, methods=["GET"]),
+    Route("/health", health, methods=["GET"]),
+]
+
+
+async def dead_letter(pubsub_message: PushMessage) -> Response:
+    """
+    Hand a push that missed its ack deadline to the dead-letter topic.
+    
+    Returns:
+        200 once the dead-letter topic has the message, 500 (so Pub/Sub
+        redelivers) when there is no dead-letter topic or publishing fails
+    """
+    logger.error(f"Processing Pub/Sub message {pubsub_message.messageId} exceeded the ack deadline")
+    
+    if dead_letter_queue is not None and await dead_letter_queue.publish_many([pubsub_message.data]):
+        return Response(status_code=200)
+    return Response(status_code=500)
 
 
 @app.post("/")
@@ -51,26 +219,55 @@ async def process_pubsub_message(request: Request):
         },
         "subscription": "..."
     }
+    
+    The ack deadline is counted from here, so waiting for a semaphore
+    slot uses it up too. Messages that miss it before their save starts
+    go to the dead-letter topic.
     """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + settings.ack_deadline_seconds - ACK_DEADLINE_MARGIN_SECONDS
+    
     try:
-        envelope = await request.json()
+        # Parse the raw body straight into the envelope struct; the
+        # base64 data comes out as bytes in the same pass. Large bodies
+        # are parsed in a thread so other pushes keep being served
+        envelope = await run_off_loop_if_large(
+            _ENVELOPE_DECODER.decode, await request.body(), settings.offload_threshold_bytes
+        )
         
         # Extract message data
-        if "message" not in envelope:
+        if envelope.message is None:
             logger.error("No message field in request")
             return Response(status_code=400)
         
-        pubsub_message = envelope["message"]
+        pubsub_message = envelope.message
         
-        # Decode the base64-encoded data
-        if "data" in pubsub_message:
-            message_data = base64.b64decode(pubsub_message["data"]).decode("utf-8")
-            message_dict = json.loads(message_data)
+        if pubsub_message.data is not None:
+            logger.info(f"Received Pub/Sub message: {pubsub_message.messageId}")
+            
+            if push_queue is not None:
+                # Ack now and process in the background; a full queue
+                # answers 503 so Pub/Sub backs off and redelivers
+                try:
+                    push_queue.put_nowait(pubsub_message.data)
+                except asyncio.QueueFull:
+                    logger.warning("Push queue full, asking Pub/Sub to redeliver")
+                    return Response(status_code=503)
+                return Response(status_code=200)
             
-            logger.info(f"Received Pub/Sub message: {pubsub_message.get('messageId')}")
+            try:
+                async with asyncio.timeout_at(deadline):
+                    await semaphore.acquire()
+            except TimeoutError:
+                return await dead_letter(pubsub_message)
             
-            # Process the message
-            await processor.process_message(message_dict)
+            # Process the message; the processor decodes the JSON bytes itself
+            try:
+                await processor.process_message(pubsub_message.data, deadline=deadline)
+            except TimeoutError:
+                return await dead_letter(pubsub_message)
+            finally:
+                semaphore.release()
             
             # Return 200 to acknowledge
             return Response(status_code=200)
@@ -87,4 +284,20 @@ async def process_pubsub_message(request: Request):
 if __name__ == "__main__":
     import os
     port = int(os.environ.get("PORT", 8080))
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    # Same serving stack as the API image: uvloop + httptools; deliveries
+    # are already logged, so the access log is off. One process unless
+    # WEB_CONCURRENCY says otherwise: each process has its own semaphore,
+    # database clients and pull loop, so up to WEB_CONCURRENCY *
+    # MAX_CONCURRENT_MESSAGES messages are in flight and WEB_CONCURRENCY *
+    # FIRESTORE_POOL_SIZE Firestore channels are open. Cloud Run's
+    # container concurrency should allow for that. Multiple workers need
+    # the import string.
+    uvicorn.run(
+        "worker.cloud_worker:app",
+        host="0.0.0.0",
+        port=port,
+        loop="uvloop",
+        http="httptools",
+        workers=int(os.environ.get("WEB_CONCURRENCY", 1)),
+        access_log=False
+    )
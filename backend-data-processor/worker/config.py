@@ -19,11 +19,22 @@ class Settings(BaseSettings):
     redis_port: int = 6379
     redis_db: int = 0
     redis_queue_name: str = "log-ingestion"
+    redis_shard_count: int = 16  # Must match between API and worker
     
     # GCP Pub/Sub
     gcp_project_id: str = ""
     pubsub_topic: str = "log-ingestion"
     pubsub_subscription: str = "log-processing-worker"
+    pubsub_pull_enabled: bool = False  # Pull batches in the background besides push delivery
+    pubsub_pull_max_messages: int = 100
+    # Ack pushes once queued instead of once processed; faster, but a crash
+    # loses whatever is still queued since Pub/Sub won't redeliver it
+    push_ack_early: bool = False
+    push_queue_size: int = 1000
+    # Pushes still processing near the subscription's ack deadline go to the
+    # dead-letter topic (when set) instead of being redelivered and redone
+    ack_deadline_seconds: float = 60.0
+    pubsub_dlq_topic: str = ""
     
     # Database
     database_type: Literal["emulator", "firestore", "sqlite"] = "sqlite"
@@ -32,8 +43,14 @@ class Settings(BaseSettings):
     
     # Processing
     enable_pii_redaction: bool = True
+    # Keep the unredacted text next to the redacted one; turning it off
+    # roughly halves each stored document
+    store_original_text: bool = True
+    simulate_processing: bool = False  # Debug only: sleep processing_time_per_char per character
     processing_time_per_char: float = 0.05
+    # Per process; the Cloud Run worker multiplies it by WEB_CONCURRENCY
     max_concurrent_messages: int = 10
+    offload_threshold_bytes: int = 64 * 1024  # Decode larger push bodies in a thread
     
     # Retry configuration
     max_retries: int = 3
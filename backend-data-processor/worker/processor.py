@@ -5,8 +5,13 @@ Simulates heavy processing and saves to database.
 import asyncio
 import logging
 import time
-from datetime import datetime
-from typing import Dict, Any
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional, Tuple, Union
+
+try:
+    import uvloop
+except ImportError:  # Optional, falls back to the default asyncio loop
+    uvloop = None
 
 from worker.config import settings
 from api.models import NormalizedMessage, ProcessedLog
@@ -21,6 +26,13 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# The log format uses neither, so skip the thread/process lookups per record
+logging.logThreads = False
+logging.logProcesses = False
+logging.logMultiprocessing = False
+
+_UTC = timezone.utc
+
 # Initialize services
 database = get_database(
     use_emulator=settings.database_type == "emulator",
@@ -35,6 +47,8 @@ message_queue = get_message_queue(
     port=settings.redis_port,
     db=settings.redis_db,
     queue_name=settings.redis_queue_name,
+    shard_count=settings.redis_shard_count,
+    max_concurrency=settings.max_concurrent_messages,
     project_id=settings.gcp_project_id,
     topic_name=settings.pubsub_topic
 )
@@ -43,95 +57,214 @@ message_queue = get_message_queue(
 class LogProcessor:
     """Processes log messages from the queue."""
     
+    # Fixed attribute set: slot reads instead of instance-dict lookups
+    __slots__ = ('pii_redactor', '_processed', '_failed', '_processing_time')
+    
     def __init__(self):
         """Initialize the log processor."""
         self.pii_redactor = PIIRedactor()
-        self.processing_stats = {
-            'total_processed': 0,
-            'total_failed': 0,
-            'total_processing_time': 0.0
-        }
+        # Plain attributes rather than a dict: bumped for every message,
+        # composed into a dict only by get_stats()
+        self._processed = 0
+        self._failed = 0
+        self._processing_time = 0.0
     
-    async def process_message(self, message_data: Dict[str, Any]) -> None:
+    async def process_message(self, message_data: Union[bytes, Dict[str, Any]],
+                              deadline: Optional[float] = None) -> None:
         """
         Process a single message from the queue.
         
         Args:
-            message_data: Message dictionary containing log data
+            message_data: Raw JSON bytes from the queue, or an already
+                decoded message dictionary
+            deadline: Event loop time by which the message must reach the
+                save, see process_messages
+            
+        Raises:
+            Exception: Whatever the message failed with (TimeoutError past
+                the deadline), so the caller can dead-letter it or have it
+                redelivered
+        """
+        failures = await self.process_messages([message_data], deadline)
+        if failures:
+            raise failures[0][1]
+    
+    async def process_messages(self, batch: List[Union[bytes, Dict[str, Any]]],
+                               deadline: Optional[float] = None) -> List[Tuple[int, Exception]]:
         """
-        start_time = time.time()
+        Process a batch of messages from the queue concurrently.
         
-        try:
-            # Deserialize message
-            message = NormalizedMessage.from_dict(message_data)
-            
-            logger.info(
-                f"Processing log: tenant={message.tenant_id}, "
-                f"log_id={message.log_id}, request_id={message.request_id}"
-            )
-            
-            # Simulate heavy CPU-bound processing
-            # 0.05 seconds per character
-            await self._simulate_processing(message.text)
-            
-            # Apply PII redaction
-            modified_text, redaction_count = self.pii_redactor.redact(
-                message.text,
-                enable=settings.enable_pii_redaction
-            )
-            
-            if redaction_count > 0:
-                logger.info(f"Redacted {redaction_count} PII instances in log {message.log_id}")
+        With simulated processing enabled, the batch waits out a single
+        sleep sized for its longest text instead of one sleep per message.
+        
+        Args:
+            batch: Raw JSON bytes from the queue, or already decoded
+                message dictionaries
+            deadline: Event loop time by which the batch must reach the
+                save; messages still being redacted then fail with
+                TimeoutError. A save that has started is never cancelled,
+                so a stored log is never reported as failed
             
-            # Calculate processing time
-            processing_time = time.time() - start_time
+        Returns:
+            (position in batch, error) for every message that failed, for
+            the caller to dead-letter or have redelivered
+        """
+        start_time = time.perf_counter()
+        failures: List[Tuple[int, Exception]] = []
+        
+        messages = []
+        for index, message_data in enumerate(batch):
+            try:
+                # Deserialize message; raw bytes are decoded and validated in
+                # one pass without building an intermediate dict
+                if isinstance(message_data, (bytes, bytearray)):
+                    messages.append((index, NormalizedMessage.from_json(message_data)))
+                else:
+                    messages.append((index, NormalizedMessage.from_dict(message_data)))
+            except Exception as e:
+                logger.error(f"Error decoding message: {e}", exc_info=True)
+                failures.append((index, e))
+        
+        if messages:
+            failures.extend(await self._process_decoded(messages, start_time, deadline))
+        
+        self._failed += len(failures)
+        return failures
+    
+    async def _process_decoded(self, messages: List[Tuple[int, NormalizedMessage]],
+                               start_time: float, deadline: Optional[float]) -> List[Tuple[int, Exception]]:
+        """
+        Redact, build and save decoded messages.
+        
+        Args:
+            messages: (position in batch, decoded message) pairs
+            start_time: When processing of the batch started
+            deadline: Event loop time by which redaction must finish, or None
             
-            # Create processed log document
-            processed_log = ProcessedLog(
-                log_id=message.log_id,
-                tenant_id=message.tenant_id,
-                source=f"{message.source}_upload",
-                original_text=message.text,
-                modified_data=modified_text,
-                ingested_at=message.ingested_at,
-                processed_at=datetime.utcnow(),
-                processing_time_seconds=round(processing_time, 3),
-                character_count=len(message.text),
-                request_id=message.request_id
-            )
+        Returns:
+            (position in batch, error) for every message that failed
+        """
+        try:
+            async with asyncio.timeout_at(deadline):
+                if settings.simulate_processing:
+                    await self._simulate_processing(max((m.text for _, m in messages), key=len))
+                
+                # Apply PII redaction to the whole batch in one scan
+                redactions = await self.pii_redactor.redact_many_async(
+                    [message.text for _, message in messages],
+                    enable=settings.enable_pii_redaction
+                )
+        except TimeoutError as e:
+            logger.error(f"Batch of {len(messages)} messages missed its deadline before saving")
+            return [(index, e) for index, _ in messages]
+        except Exception as e:
+            logger.error(f"Error redacting batch of {len(messages)} messages: {e}", exc_info=True)
+            return [(index, e) for index, _ in messages]
+        
+        failures = []
+        prepared = []
+        for (index, message), (modified_text, redaction_count) in zip(messages, redactions):
+            try:
+                prepared.append(
+                    (index, *self._prepare(message, modified_text, redaction_count, start_time))
+                )
+            except Exception as e:
+                logger.error(f"Error processing message: {e}", exc_info=True)
+                failures.append((index, e))
+        
+        if prepared:
+            failures.extend(await self._save(prepared))
+        return failures
+    
+    def _prepare(self, message: NormalizedMessage, modified_text: str, redaction_count: int,
+                 start_time: float) -> Tuple[NormalizedMessage, dict, float]:
+        """
+        Build the processed log document for one redacted message.
+        
+        Args:
+            message: Decoded message
+            modified_text: Message text with PII redacted
+            redaction_count: Number of PII instances redacted
+            start_time: When processing of its batch started
             
-            # Save to database with multi-tenant isolation
-            success = await database.save_processed_log(
-                tenant_id=message.tenant_id,
-                log_id=message.log_id,
-                data=processed_log.to_firestore_dict()
+        Returns:
+            Tuple of (message, document, processing time)
+        """
+        # Per-message logs are formatted lazily and skipped outright
+        # when INFO is disabled
+        log_info = logger.isEnabledFor(logging.INFO)
+        if log_info:
+            logger.info(
+                "Processing log: tenant=%s, log_id=%s, request_id=%s",
+                message.tenant_id, message.log_id, message.request_id
             )
+        
+        if redaction_count > 0 and log_info:
+            logger.info("Redacted %d PII instances in log %s", redaction_count, message.log_id)
+        
+        # Calculate processing time
+        processing_time = time.perf_counter() - start_time
+        
+        # Create processed log document
+        processed_log = ProcessedLog(
+            log_id=message.log_id,
+            tenant_id=message.tenant_id,
+            source=f"{message.source}_upload",
+            original_text=message.text if settings.store_original_text else None,
+            modified_data=modified_text,
+            ingested_at=message.ingested_at,
+            processed_at=datetime.now(_UTC),
+            processing_time_seconds=round(processing_time, 3),
+            character_count=len(message.text),
+            request_id=message.request_id
+        )
+        
+        return message, processed_log.to_firestore_dict(), processing_time
+    
+    async def _save(self, prepared: List[Tuple[int, NormalizedMessage, dict, float]]) -> List[Tuple[int, Exception]]:
+        """
+        Save a batch of processed logs in one database call and record the outcomes.
+        
+        Args:
+            prepared: (position in batch, message, document, processing time) tuples
             
+        Returns:
+            (position in batch, error) for every log that wasn't saved
+        """
+        try:
+            # Save to database with multi-tenant isolation; the backend
+            # commits the whole batch together
+            results = await database.save_processed_logs_many([
+                (message.tenant_id, message.log_id, data)
+                for _, message, data, _ in prepared
+            ])
+        except Exception as e:
+            logger.error(f"Error saving processed logs: {e}", exc_info=True)
+            return [(index, e) for index, *_ in prepared]
+        
+        failures = []
+        log_info = logger.isEnabledFor(logging.INFO)
+        for (index, message, _, processing_time), success in zip(prepared, results):
             if success:
-                self.processing_stats['total_processed'] += 1
-                self.processing_stats['total_processing_time'] += processing_time
+                self._processed += 1
+                self._processing_time += processing_time
                 
-                logger.info(
-                    f"Successfully processed log: tenant={message.tenant_id}, "
-                    f"log_id={message.log_id}, time={processing_time:.3f}s"
-                )
+                if log_info:
+                    logger.info(
+                        "Successfully processed log: tenant=%s, log_id=%s, time=%.3fs",
+                        message.tenant_id, message.log_id, processing_time
+                    )
             else:
-                self.processing_stats['total_failed'] += 1
                 logger.error(f"Failed to save processed log: {message.log_id}")
-                # In production, would push to dead-letter queue
-        
-        except Exception as e:
-            self.processing_stats['total_failed'] += 1
-            logger.error(
-                f"Error processing message: {e}",
-                exc_info=True
-            )
-            # In production, would implement retry logic and dead-letter queue
+                failures.append(
+                    (index, RuntimeError(f"Failed to save processed log {message.log_id}"))
+                )
+        return failures
     
     async def _simulate_processing(self, text: str) -> None:
         """
         Simulate CPU-bound heavy processing.
-        Sleeps for 0.05 seconds per character.
+        Sleeps for processing_time_per_char (0.05 by default) seconds per character.
         
         Args:
             text: Text to process
@@ -151,20 +284,19 @@ class LogProcessor:
         Returns:
             Dictionary with processing stats
         """
-        total = self.processing_stats['total_processed'] + self.processing_stats['total_failed']
+        total = self._processed + self._failed
         avg_time = (
-            self.processing_stats['total_processing_time'] / 
-            self.processing_stats['total_processed']
-            if self.processing_stats['total_processed'] > 0
+            self._processing_time / self._processed
+            if self._processed > 0
             else 0
         )
         
         return {
             'total_messages': total,
-            'successful': self.processing_stats['total_processed'],
-            'failed': self.processing_stats['total_failed'],
+            'successful': self._processed,
+            'failed': self._failed,
             'success_rate': (
-                self.processing_stats['total_processed'] / total * 100
+                self._processed / total * 100
                 if total > 0
                 else 0
             ),
@@ -182,8 +314,13 @@ async def main():
     processor = LogProcessor()
     
     try:
-        # Subscribe to message queue
-        await message_queue.subscribe(processor.process_message)
+        # Open connections before the first message arrives
+        await database.connect()
+        await message_queue.connect()
+        
+        # Subscribe to message queue; each popped batch is processed
+        # (simulated, redacted and saved) together
+        await message_queue.subscribe(processor.process_messages, decode=False, batch=True)
     except KeyboardInterrupt:
         logger.info("Received shutdown signal")
     except Exception as e:
@@ -195,8 +332,13 @@ async def main():
         
         # Cleanup
         await message_queue.close()
+        await database.close()
         logger.info("Worker shutdown complete")
 
 
 if __name__ == "__main__":
+    # The subscriber's Redis and aiosqlite handoffs run on uvloop when it is
+    # installed; set here so importing this module changes no global state
+    if uvloop is not None:
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
     asyncio.run(main())